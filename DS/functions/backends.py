@@ -0,0 +1,138 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+class KerasBackend:
+    """
+    Runs the character model through Keras. Needs TensorFlow, which is imported on creation.
+
+    Parameters:
+    model_path (str): Path to the .keras model file.
+    """
+
+    def __init__(self, model_path):
+        from keras.models import load_model
+
+        self.model = load_model(model_path, compile=False)
+
+    def predict(self, batch):
+        """
+        Parameters:
+        batch (numpy.ndarray): Character images with shape (N, 28, 28, 3).
+
+        Returns:
+        numpy.ndarray: Class probabilities with shape (N, 36).
+        """
+        return np.asarray(self.model.predict_on_batch(batch))
+
+
+class OnnxBackend:
+    """
+    Runs the exported ONNX model through onnxruntime on the CPU.
+
+    Parameters:
+    model_path (str): Path to the .onnx model file created by DS/functions/export_model.py.
+    """
+
+    def __init__(self, model_path):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = 1  # parallelism comes from the recognition workers
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch):
+        """
+        Parameters:
+        batch (numpy.ndarray): Character images with shape (N, 28, 28, 3).
+
+        Returns:
+        numpy.ndarray: Class probabilities with shape (N, 36).
+        """
+        return self.session.run(None, {self.input_name: batch.astype(np.float32, copy=False)})[0]
+
+
+class NumpyBackend:
+    """
+    Runs the character model with plain NumPy matrix multiplications, without any ML runtime.
+
+    It implements the architecture trained in DS/notebook/plate_recognizable_model_keras.ipynb:
+    four blocks of Conv2D(3x3, 'same', relu) + MaxPooling2D(2x2), then Flatten and a softmax Dense
+    layer (Dropout does nothing at inference).
+
+    Parameters:
+    weights_path (str): Path to the .npz weights file created by DS/functions/export_model.py.
+    """
+
+    def __init__(self, weights_path):
+        weights = np.load(weights_path)
+        self.convs = []
+        i = 0
+        while f'conv{i}_kernel' in weights:
+            kernel = weights[f'conv{i}_kernel'].astype(np.float32)
+            kh, kw, c_in, c_out = kernel.shape
+            # The kernel is flattened in the same (kh, kw, c_in) order as the image patches below
+            self.convs.append((kernel.reshape(kh * kw * c_in, c_out), weights[f'conv{i}_bias'].astype(np.float32),
+                               kh, kw))
+            i += 1
+        self.dense_kernel = weights['dense_kernel'].astype(np.float32)
+        self.dense_bias = weights['dense_bias'].astype(np.float32)
+
+    @staticmethod
+    def _conv_relu(x, kernel, bias, kh, kw):
+        n, h, w, c = x.shape
+        padded = np.pad(x, ((0, 0), (kh // 2, kh // 2), (kw // 2, kw // 2), (0, 0)))
+        # (N, H, W, C, kh, kw) windows -> (N * H * W, kh * kw * C) patches
+        patches = sliding_window_view(padded, (kh, kw), axis=(1, 2)).transpose(0, 1, 2, 4, 5, 3)
+        out = patches.reshape(n * h * w, kh * kw * c) @ kernel
+        out += bias
+        np.maximum(out, 0, out=out)
+        return out.reshape(n, h, w, -1)
+
+    @staticmethod
+    def _max_pool(x):
+        n, h, w, c = x.shape
+        x = x[:, :h // 2 * 2, :w // 2 * 2, :]
+        return x.reshape(n, h // 2, 2, w // 2, 2, c).max(axis=(2, 4))
+
+    def predict(self, batch):
+        """
+        Parameters:
+        batch (numpy.ndarray): Character images with shape (N, 28, 28, 3).
+
+        Returns:
+        numpy.ndarray: Class probabilities with shape (N, 36).
+        """
+        x = batch.astype(np.float32, copy=False)
+        for kernel, bias, kh, kw in self.convs:
+            x = self._max_pool(self._conv_relu(x, kernel, bias, kh, kw))
+
+        logits = x.reshape(len(x), -1) @ self.dense_kernel + self.dense_bias
+        logits -= logits.max(axis=1, keepdims=True)
+        proba = np.exp(logits)
+        proba /= proba.sum(axis=1, keepdims=True)
+        return proba
+
+
+BACKENDS = {
+    'keras': KerasBackend,
+    'onnx': OnnxBackend,
+    'numpy': NumpyBackend,
+}
+
+
+def load_backend(name, model_path):
+    """
+    Creates the inference backend selected by configuration.
+
+    Parameters:
+    name (str): One of 'keras', 'onnx' or 'numpy'.
+    model_path (str): Path to the model file of that backend.
+
+    Returns:
+    KerasBackend | OnnxBackend | NumpyBackend: The backend, ready for predict().
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{name}', expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[name](model_path)
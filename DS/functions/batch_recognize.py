@@ -0,0 +1,212 @@
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+FIELDNAMES = ['file', 'plate', 'confidence', 'seconds', 'error']
+
+
+def _init_worker():
+    """
+    Loads the Haar cascade and the character model once in every worker process.
+
+    Returns:
+    None
+    """
+    from DS.functions.recognizer import recognizer
+
+    recognizer.warmup()
+
+
+def recognize_file(img_dir, img_file):
+    """
+    Recognizes the license plate on one image file. Runs inside a worker process.
+
+    Parameters:
+    img_dir (str): The directory that is being processed.
+    img_file (str): Path of the image relative to img_dir.
+
+    Returns:
+    dict: The file, the recognized plate, its confidence, the processing time in seconds and an error if any.
+    """
+    from DS.functions.image_process import classify_plate, detect_plate, read_image, segment_characters
+
+    start = time.perf_counter()
+    result = {'file': img_file, 'plate': None, 'confidence': None, 'seconds': None, 'error': None}
+    try:
+        img = read_image(os.path.join(img_dir, img_file))
+        _, plate = detect_plate(img)
+        if plate is not None:
+            result['plate'], result['confidence'] = classify_plate(segment_characters(plate))
+            result['plate'] = result['plate'] or None
+    except Exception as err:
+        result['error'] = f"{type(err).__name__}: {err}"
+    result['seconds'] = round(time.perf_counter() - start, 4)
+    return result
+
+
+def list_images(img_dir):
+    """
+    Finds all images in a directory and its subdirectories.
+
+    Parameters:
+    img_dir (str): The directory with the gate photos.
+
+    Returns:
+    list: Paths of the images relative to img_dir, in a stable order.
+    """
+    img_files = []
+    for root, _, files in os.walk(img_dir):
+        for file_name in files:
+            if file_name.lower().endswith(IMAGE_EXTENSIONS):
+                img_files.append(os.path.relpath(os.path.join(root, file_name), img_dir))
+    return sorted(img_files)
+
+
+def read_checkpoint(output_path, output_format):
+    """
+    Reads the files that already have a result in the output file, so an interrupted run can be resumed.
+
+    Parameters:
+    output_path (str): The JSONL or CSV file with the results of a previous run.
+    output_format (str): 'jsonl' or 'csv'.
+
+    Returns:
+    set: Paths of the images that were already processed.
+    """
+    if not os.path.exists(output_path):
+        return set()
+
+    with open(output_path, newline='', encoding='utf-8') as file:
+        if output_format == 'csv':
+            return {row['file'] for row in csv.DictReader(file)}
+        done = set()
+        for line in file:
+            try:
+                done.add(json.loads(line)['file'])
+            except (ValueError, KeyError):
+                continue  # a line cut off by the interruption, the file is processed again
+        return done
+
+
+class ResultWriter:
+    """
+    Appends results to a JSONL or CSV file, flushing every line so the file is always a valid checkpoint.
+
+    Parameters:
+    output_path (str): The file to write.
+    output_format (str): 'jsonl' or 'csv'.
+    """
+
+    def __init__(self, output_path, output_format):
+        self.output_format = output_format
+        new_file = not os.path.exists(output_path) or os.path.getsize(output_path) == 0
+        self.file = open(output_path, 'a', newline='', encoding='utf-8')
+        if output_format == 'csv':
+            self.writer = csv.DictWriter(self.file, fieldnames=FIELDNAMES)
+            if new_file:
+                self.writer.writeheader()
+
+    def write(self, result):
+        if self.output_format == 'csv':
+            self.writer.writerow(result)
+        else:
+            self.file.write(json.dumps(result, ensure_ascii=False) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def run(img_dir, output_path, output_format, workers, resume=True, report_every=500):
+    """
+    Recognizes every image of a directory with a pool of worker processes and streams the results.
+
+    Parameters:
+    img_dir (str): The directory with the gate photos.
+    output_path (str): The JSONL or CSV file for the results.
+    output_format (str): 'jsonl' or 'csv'.
+    workers (int): Number of worker processes.
+    resume (bool): Skip the images that already have a result in output_path.
+    report_every (int): Print the throughput after this many images.
+
+    Returns:
+    dict: Number of processed images, recognized plates, errors, elapsed seconds and images per second.
+    """
+    img_files = list_images(img_dir)
+    if resume:
+        done = read_checkpoint(output_path, output_format)
+        img_files = [img_file for img_file in img_files if img_file not in done]
+    else:
+        open(output_path, 'w').close()
+
+    print(f"{len(img_files)} images to recognize with {workers} workers")
+
+    stats = {'processed': 0, 'recognized': 0, 'errors': 0}
+    writer = ResultWriter(output_path, output_format)
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        pending = set()
+        files = iter(img_files)
+        max_pending = workers * 4  # only a few tasks are queued, so memory stays flat for any directory size
+
+        while True:
+            for img_file in files:
+                pending.add(executor.submit(recognize_file, img_dir, img_file))
+                if len(pending) >= max_pending:
+                    break
+            if not pending:
+                break
+
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                result = future.result()
+                writer.write(result)
+                stats['processed'] += 1
+                stats['recognized'] += result['plate'] is not None
+                stats['errors'] += result['error'] is not None
+
+                if stats['processed'] % report_every == 0:
+                    elapsed = time.perf_counter() - start
+                    print(f"{stats['processed']}/{len(img_files)} images, {stats['processed'] / elapsed:.1f} images/sec")
+
+    writer.close()
+    stats['seconds'] = round(time.perf_counter() - start, 2)
+    stats['images_per_second'] = round(stats['processed'] / stats['seconds'], 2) if stats['seconds'] else 0.0
+    return stats
+
+
+def main():
+    """
+    Bulk license plate recognition of a directory of archived gate photos.
+
+    Usage (from the repository root):
+        python -m DS.functions.batch_recognize DS/images --output results.jsonl --workers 8
+
+    Running the same command again resumes from the results already written to --output.
+
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Recognize license plates of all images in a directory")
+    parser.add_argument('img_dir')
+    parser.add_argument('--output', default='DS/results/recognition.jsonl', help="a .jsonl or .csv file")
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help="defaults to the extension of --output")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--no-resume', action='store_true', help="start over instead of skipping processed files")
+    parser.add_argument('--report-every', type=int, default=500)
+    args = parser.parse_args()
+
+    output_format = args.format or ('csv' if args.output.endswith('.csv') else 'jsonl')
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+
+    stats = run(args.img_dir, args.output, output_format, args.workers, not args.no_resume, args.report_every)
+    print(f"Processed {stats['processed']} images ({stats['recognized']} recognized, {stats['errors']} errors) "
+          f"in {stats['seconds']}s, {stats['images_per_second']} images/sec")
+
+
+if __name__ == '__main__':
+    main()
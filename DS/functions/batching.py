@@ -0,0 +1,112 @@
+import threading
+import time
+
+import numpy as np
+
+
+class _PendingBatch:
+    """
+    A batch of character images waiting to be classified together with other callers' batches.
+    """
+
+    def __init__(self, images):
+        self.images = images
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """
+    Merges character batches from several concurrent callers into a single model call.
+
+    The first caller to arrive becomes the leader: it waits up to ``max_wait`` seconds (or until
+    ``max_batch_size`` characters are queued), runs one inference over everything collected and hands
+    every follower its own slice of the probabilities. With ``max_wait=0`` each call runs immediately,
+    so a single caller never pays extra latency.
+
+    Parameters:
+    predict (callable): Function that takes a (N, 28, 28, 3) array and returns (N, classes) probabilities.
+    max_batch_size (int): Number of queued characters after which the leader stops waiting.
+    max_wait (float): Maximum time in seconds the leader waits for other callers.
+    """
+
+    def __init__(self, predict, max_batch_size=64, max_wait=0.0):
+        self.predict = predict
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._queue = []
+        self._queued = 0
+        self._leader_active = False
+
+    def classify(self, images):
+        """
+        Classifies a batch of character images, possibly together with batches of other callers.
+
+        Parameters:
+        images (numpy.ndarray): Character images with shape (N, 28, 28, 3).
+
+        Returns:
+        numpy.ndarray: Class probabilities with shape (N, classes).
+        """
+        pending = _PendingBatch(images)
+
+        with self._cond:
+            self._queue.append(pending)
+            self._queued += len(images)
+
+            if self._leader_active:
+                # Another caller is collecting a batch, we only wake it up when the batch is full
+                if self._queued >= self.max_batch_size:
+                    self._cond.notify_all()
+                is_leader = False
+            else:
+                is_leader = True
+                self._leader_active = True
+                deadline = time.monotonic() + self.max_wait
+                while self._queued < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+                batches, self._queue = self._queue, []
+                self._queued = 0
+                self._leader_active = False
+
+        if not is_leader:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.result
+
+        self._run(batches)
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _run(self, batches):
+        """
+        Runs a single inference over the collected batches and distributes the results.
+
+        Parameters:
+        batches (list): The pending batches collected by the leader.
+        """
+        try:
+            if len(batches) == 1:
+                probabilities = self.predict(batches[0].images)
+            else:
+                probabilities = self.predict(np.concatenate([batch.images for batch in batches]))
+
+            start = 0
+            for batch in batches:
+                end = start + len(batch.images)
+                batch.result = probabilities[start:end]
+                start = end
+        except Exception as err:
+            for batch in batches:
+                batch.error = err
+        finally:
+            for batch in batches:
+                batch.done.set()
@@ -0,0 +1,202 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from DS.functions.configuration import INFERENCE_BACKEND
+from DS.functions.dataset import load_validation_set
+from DS.functions.image_process import CHARACTERS, classify_plate, detect_plate, read_image, segment_characters
+from DS.functions.recognizer import recognizer
+
+STAGES = ['decode', 'detect_plate', 'segment_characters', 'show_results']
+BASELINE = 'DS/benchmarks/baseline.json'
+
+
+def percentile(values, q):
+    """
+    Parameters:
+    values (list): Measured latencies in seconds.
+    q (float): The percentile, e.g. 50 or 95.
+
+    Returns:
+    float or None: The percentile in milliseconds, None if nothing was measured.
+    """
+    if not values:
+        return None
+    return round(float(np.percentile(values, q)) * 1000, 3)
+
+
+def peak_rss_mb():
+    """
+    Returns:
+    float: The peak resident set size of this process in megabytes.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def benchmark_plates(img_dir, repeat):
+    """
+    Runs the recognition pipeline stage by stage over the plate photos.
+    The expected plate is the file name of the photo without extension (e.g. AE7094HC.jpg).
+
+    Parameters:
+    img_dir (str): Directory with the car photos, e.g. DS/images.
+    repeat (int): How many times every photo is processed.
+
+    Returns:
+    dict: Latencies of every stage, images per second and plate accuracy.
+    """
+    timings = {stage: [] for stage in STAGES}
+    img_files = sorted(f for f in os.listdir(img_dir) if os.path.isfile(os.path.join(img_dir, f)))
+    correct = 0
+    total_time = 0.0
+
+    for _ in range(repeat):
+        for img_file in img_files:
+            with open(os.path.join(img_dir, img_file), 'rb') as file:
+                photo = file.read()
+
+            start = time.perf_counter()
+            img = read_image(photo)
+            decoded = time.perf_counter()
+            _, plate = detect_plate(img)
+            detected = time.perf_counter()
+            timings['decode'].append(decoded - start)
+            timings['detect_plate'].append(detected - decoded)
+
+            plate_number = ''
+            if plate is not None:
+                char = segment_characters(plate)
+                segmented = time.perf_counter()
+                plate_number, _ = classify_plate(char)
+                classified = time.perf_counter()
+                timings['segment_characters'].append(segmented - detected)
+                timings['show_results'].append(classified - segmented)
+            total_time += time.perf_counter() - start
+
+            correct += plate_number == os.path.splitext(img_file)[0].upper()
+
+    processed = len(img_files) * repeat
+    return {
+        'images': processed,
+        'images_per_second': round(processed / total_time, 2) if total_time else None,
+        'plate_accuracy': round(correct / processed, 4) if processed else None,
+        'stages': {stage: {'p50_ms': percentile(values, 50), 'p95_ms': percentile(values, 95), 'count': len(values)}
+                   for stage, values in timings.items()},
+    }
+
+
+def benchmark_characters(val_dir):
+    """
+    Classifies the validation characters prepared the same way show_results receives them (see load_validation_set).
+
+    Parameters:
+    val_dir (str): Directory with one class_<character> folder per class, e.g. DS/data/val.
+
+    Returns:
+    dict: Number of characters, character accuracy and the classification throughput.
+    """
+    batch, labels = load_validation_set(val_dir)
+    start = time.perf_counter()
+    predicted, _ = classify_plate(batch)
+    elapsed = time.perf_counter() - start
+
+    correct = sum(p == CHARACTERS[label] for p, label in zip(predicted, labels))
+    return {
+        'characters': len(labels),
+        'character_accuracy': round(correct / len(labels), 4) if labels else None,
+        'characters_per_second': round(len(labels) / elapsed, 1) if elapsed else None,
+    }
+
+
+def compare(result, baseline, latency_tolerance, accuracy_tolerance):
+    """
+    Compares a benchmark result with the baseline.
+
+    Parameters:
+    result (dict): The current benchmark result.
+    baseline (dict): The saved baseline result.
+    latency_tolerance (float): Allowed relative latency growth, e.g. 0.2 for 20%.
+    accuracy_tolerance (float): Allowed absolute accuracy drop.
+
+    Returns:
+    list: Descriptions of the regressions, empty if there are none.
+    """
+    regressions = []
+    for stage in STAGES:
+        for key in ('p50_ms', 'p95_ms'):
+            old = baseline['plates']['stages'][stage][key]
+            new = result['plates']['stages'][stage][key]
+            if old and new and new > old * (1 + latency_tolerance):
+                regressions.append(f"{stage} {key}: {old} -> {new}")
+
+    for section, key in (('plates', 'plate_accuracy'), ('characters', 'character_accuracy')):
+        old = baseline[section][key]
+        new = result[section][key]
+        if old is not None and new is not None and new < old - accuracy_tolerance:
+            regressions.append(f"{key}: {old} -> {new}")
+    return regressions
+
+
+def main():
+    """
+    Benchmarks speed and accuracy of the recognition pipeline.
+
+    Usage (from the repository root):
+        python -m DS.functions.benchmark --save-baseline    # record DS/benchmarks/baseline.json
+        python -m DS.functions.benchmark --compare          # fail if slower or less accurate than the baseline
+
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the license plate recognition pipeline")
+    parser.add_argument('--images', default='DS/images')
+    parser.add_argument('--val-dir', default='DS/data/val')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help="write the result as JSON to this file")
+    parser.add_argument('--save-baseline', nargs='?', const=BASELINE, metavar='PATH')
+    parser.add_argument('--compare', nargs='?', const=BASELINE, metavar='PATH')
+    parser.add_argument('--latency-tolerance', type=float, default=0.2)
+    parser.add_argument('--accuracy-tolerance', type=float, default=0.0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    recognizer.warmup()
+    warmup_seconds = round(time.perf_counter() - start, 3)
+
+    result = {
+        'backend': INFERENCE_BACKEND,
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'warmup_seconds': warmup_seconds,
+        'plates': benchmark_plates(args.images, args.repeat),
+        'characters': benchmark_characters(args.val_dir),
+    }
+    result['peak_rss_mb'] = peak_rss_mb()
+    report = json.dumps(result, indent=2)
+    print(report)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with open(path, 'w') as file:
+                file.write(report + '\n')
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(result, baseline, args.latency_tolerance, args.accuracy_tolerance)
+        if regressions:
+            raise SystemExit("Regressions against the baseline:\n" + '\n'.join(regressions))
+        print("No regressions against the baseline")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,41 @@
+import json
+import os
+
 # The path to the XML file of the Haar cascade classifier and our model
 CASCADE_ClASIFIER = 'DS/models/haarcascade_ua_license_plate.xml'
 MODEL = 'DS/models/model_character_recognition.keras'
 
-# Image saving format after processing
-OUTPUT_FORMAT = 'png'
+# Exported versions of the model for the lightweight inference backends (python -m DS.functions.export_model)
+ONNX_MODEL = 'DS/models/model_character_recognition.onnx'
+NUMPY_MODEL = 'DS/models/model_character_recognition.npz'
+
+# Inference backend of the character model: 'keras', 'onnx' or 'numpy'
+INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'keras')
+
+# Image saving format after processing: 'png', 'jpg' or 'webp', the quality (0-100) of jpg and webp,
+# and the maximum width of the saved image (0 keeps the full resolution)
+OUTPUT_FORMAT = os.getenv('OUTPUT_FORMAT', 'png')
+OUTPUT_QUALITY = int(os.getenv('OUTPUT_QUALITY', 85))
+OUTPUT_MAX_WIDTH = int(os.getenv('OUTPUT_MAX_WIDTH', 0))
 
 # license plate contour recognition coefficients
-SCALE_FACTOR = 1.15
-MIN_NEIGHBORS = 7
+SCALE_FACTOR = float(os.getenv('SCALE_FACTOR', 1.3))
+MIN_NEIGHBORS = int(os.getenv('MIN_NEIGHBORS', 8))
+
+# The cascade runs on a copy of the image downscaled to at most this width (0 keeps the full resolution)
+DETECTION_MAX_WIDTH = int(os.getenv('DETECTION_MAX_WIDTH', 0))
+
+# Regions of interest of the gate cameras as fractions of the frame: {"camera id": [x, y, width, height]},
+# e.g. DETECTION_ROI='{"gate-1": [0.25, 0.4, 0.5, 0.6]}'; cameras without a region are searched entirely
+DETECTION_ROI = json.loads(os.getenv('DETECTION_ROI', '{}'))
 
 # coefficients of the contours of the symbols of the clipped license plate in the function detect_plate
 WIDTH_LOWER = 1/10
 WIDTH_UPPER = 2/3
 HEIGH_LOWER = 1/10
 HEIGH_UPPER = 3/5
+
+# Character classification batching: the maximum number of characters in one model call and
+# how long (in seconds) to wait for characters of concurrent requests before running it (0 disables merging)
+BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', 64))
+BATCH_MAX_WAIT = float(os.getenv('BATCH_MAX_WAIT', 0.002))
@@ -0,0 +1,31 @@
+import os
+
+import cv2
+import numpy as np
+
+from DS.functions.image_process import CHARACTERS, fix_dimension
+
+
+def load_validation_set(val_dir):
+    """
+    Loads the validation characters prepared the way find_contours prepares the characters of a plate
+    for the model: grayscale, resized to 28x28 with INTER_AREA, in the 0-255 range and repeated
+    in the 3 channels by fix_dimension. The benchmark and the export parity check both use it,
+    so their accuracies are measured on the same input.
+
+    Parameters:
+    val_dir (str): Directory with one class_<character> folder per class, e.g. DS/data/val.
+
+    Returns:
+    numpy.ndarray: Images with shape (N, 28, 28, 3).
+    numpy.ndarray: Class indices into CHARACTERS with shape (N,).
+    """
+    images = []
+    labels = []
+    for class_dir in sorted(os.listdir(val_dir)):
+        label = CHARACTERS.index(class_dir.split('_')[-1])
+        for file_name in sorted(os.listdir(os.path.join(val_dir, class_dir))):
+            img = cv2.imread(os.path.join(val_dir, class_dir, file_name), cv2.IMREAD_GRAYSCALE)
+            images.append(cv2.resize(img, (28, 28), interpolation=cv2.INTER_AREA))
+            labels.append(label)
+    return fix_dimension(np.array(images)), np.array(labels)
@@ -0,0 +1,102 @@
+import argparse
+
+import numpy as np
+
+from DS.functions.backends import KerasBackend, load_backend
+from DS.functions.configuration import MODEL, ONNX_MODEL, NUMPY_MODEL
+from DS.functions.dataset import load_validation_set
+
+
+def export_onnx(keras_model, output_path):
+    """
+    Converts the Keras character model to ONNX with a dynamic batch dimension.
+
+    Parameters:
+    keras_model (keras.Model): The loaded character recognition model.
+    output_path (str): Where to write the .onnx file.
+    """
+    import tensorflow as tf
+    import tf2onnx
+
+    signature = [tf.TensorSpec((None, 28, 28, 3), tf.float32, name='input')]
+    tf2onnx.convert.from_keras(keras_model, input_signature=signature, output_path=output_path)
+
+
+def export_numpy(keras_model, output_path):
+    """
+    Saves the weights of the Keras character model in the .npz layout read by NumpyBackend.
+
+    Parameters:
+    keras_model (keras.Model): The loaded character recognition model.
+    output_path (str): Where to write the .npz file.
+    """
+    weights = {}
+    conv_index = 0
+    for layer in keras_model.layers:
+        kind = layer.__class__.__name__
+        if kind == 'Conv2D':
+            weights[f'conv{conv_index}_kernel'], weights[f'conv{conv_index}_bias'] = layer.get_weights()
+            conv_index += 1
+        elif kind == 'Dense':
+            weights['dense_kernel'], weights['dense_bias'] = layer.get_weights()
+    np.savez(output_path, **weights)
+
+
+def check_parity(reference, backend, val_dir, tolerance=1e-4):
+    """
+    Compares the outputs of an exported backend with the Keras model on the validation set.
+
+    Parameters:
+    reference (KerasBackend): The Keras model the backend was exported from.
+    backend (OnnxBackend | NumpyBackend): The exported backend.
+    val_dir (str): Directory with the validation class folders.
+    tolerance (float): The largest allowed difference between probabilities.
+
+    Returns:
+    bool: True if the probabilities match within the tolerance and every prediction is the same.
+    """
+    images, labels = load_validation_set(val_dir)
+    expected = reference.predict(images)
+    actual = backend.predict(images)
+
+    max_diff = float(np.abs(expected - actual).max())
+    same_predictions = float((expected.argmax(axis=1) == actual.argmax(axis=1)).mean())
+    accuracy = float((actual.argmax(axis=1) == labels).mean())
+    print(f"{len(images)} characters: max probability difference {max_diff:.2e}, "
+          f"same predictions {same_predictions:.2%}, accuracy {accuracy:.2%}")
+    return max_diff <= tolerance and same_predictions == 1.0
+
+
+def main():
+    """
+    Exports the character model for the lightweight inference backends and checks their parity with Keras.
+
+    Usage (from the repository root):
+        python -m DS.functions.export_model --format all --check
+
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Export the character recognition model")
+    parser.add_argument('--format', choices=['onnx', 'numpy', 'all'], default='all')
+    parser.add_argument('--check', action='store_true', help="compare the exported model with Keras on --val-dir")
+    parser.add_argument('--val-dir', default='DS/data/val')
+    args = parser.parse_args()
+
+    reference = KerasBackend(MODEL)
+    exports = {'onnx': (export_onnx, ONNX_MODEL), 'numpy': (export_numpy, NUMPY_MODEL)}
+    formats = list(exports) if args.format == 'all' else [args.format]
+
+    parity_ok = True
+    for name in formats:
+        export, output_path = exports[name]
+        export(reference.model, output_path)
+        print(f"Exported {name} model to {output_path}")
+        if args.check:
+            parity_ok = check_parity(reference, load_backend(name, output_path), args.val_dir) and parity_ok
+
+    if not parity_ok:
+        raise SystemExit("Exported model does not match the Keras model")
+
+
+if __name__ == '__main__':
+    main()
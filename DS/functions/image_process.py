@@ -1,59 +1,110 @@
 import os
 import asyncio
+import time
 
 import cv2
 from datetime import datetime
 import numpy as np
-from keras.models import load_model
 
-# The path to the XML file of the Haar cascade classifier and our model
-CASCADE_ClASIFIER = 'DS/models/haarcascade_ua_license_plate.xml'
-MODEL = 'DS/models/model_character_recognition.keras'
+from DS.functions.batching import MicroBatcher
+from DS.functions.configuration import (OUTPUT_FORMAT, OUTPUT_QUALITY, OUTPUT_MAX_WIDTH,
+                                        SCALE_FACTOR, MIN_NEIGHBORS, DETECTION_MAX_WIDTH, DETECTION_ROI,
+                                        WIDTH_LOWER, WIDTH_UPPER, HEIGH_LOWER, HEIGH_UPPER,
+                                        BATCH_MAX_SIZE, BATCH_MAX_WAIT)
+from DS.functions.recognizer import recognizer
 
-# Image saving format after processing
-OUTPUT_FORMAT = 'png'
 
-# license plate contour recognition coefficients
-SCALE_FACTOR = 1.15
-MIN_NEIGHBORS = 7
+def classify_characters(batch):
+    """
+    Runs the character model once over a whole batch of character images.
+
+    Parameters:
+    batch (numpy.ndarray): Character images with shape (N, 28, 28, 3).
+
+    Returns:
+    numpy.ndarray: Class probabilities with shape (N, 36).
+    """
+    return recognizer.backend.predict(batch)
 
-# coefficients of the contours of the symbols of the clipped license plate in the function detect_plate
-WIDTH_LOWER = 1 / 10
-WIDTH_UPPER = 2 / 3
-HEIGH_LOWER = 1 / 10
-HEIGH_UPPER = 3 / 5
 
-model = load_model(MODEL, compile=False)
-plate_cascade = cv2.CascadeClassifier(CASCADE_ClASIFIER)
+# Classes of the character model, in the order of its outputs
+CHARACTERS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
 
+# Characters of concurrent requests are merged into a single model call
+character_batcher = MicroBatcher(classify_characters, max_batch_size=BATCH_MAX_SIZE, max_wait=BATCH_MAX_WAIT)
 
-async def detect_plate(img, text=''):
+
+def detection_region(img, camera=None):
     """
-    The function is designed for detecting and processing license plates in an image.
+    Returns the part of the image in which license plates are searched for.
 
     Parameters:
-    img (numpy.array): The image in which the license plates need to be detected and processed.
-    text (str, optional): Text that can be added to the image around the license plate.
+    img (numpy.ndarray): The full resolution image.
+    camera (str, optional): Identifier of the gate camera, used to look up its region in DETECTION_ROI.
 
     Returns:
-    numpy.array: The image with highlighted license plates and optionally added text.
-    numpy.array or None: The image of the license plate area for further processing, or None if the license plate was not detected.
+    tuple: The (x0, y0, x1, y1) pixel bounds of the region, the whole image if the camera has no region.
     """
-    plate_img = img.copy()  # We copy the input image for processing
-    roi = img.copy()  # Copy the input image to highlight the license plate area
+    height, width = img.shape[:2]
+    if camera is None or camera not in DETECTION_ROI:
+        return 0, 0, width, height
+
+    # The region is configured as fractions of the frame, so it does not depend on the camera resolution
+    x, y, w, h = DETECTION_ROI[camera]
+    x0, y0 = int(x * width), int(y * height)
+    x1, y1 = min(int((x + w) * width), width), min(int((y + h) * height), height)
+    return x0, y0, x1, y1
+
+
+def find_plates(img, camera=None):
+    """
+    The function is designed for detecting license plates in an image.
+
+    The cascade runs on a grayscale copy of the camera's region of interest, downscaled to at most
+    DETECTION_MAX_WIDTH pixels wide; the detected boxes are mapped back to the full resolution image.
+
+    Parameters:
+    img (numpy.array): The image in which the license plates need to be detected.
+    camera (str, optional): Identifier of the gate camera, used to restrict detection to its region of interest.
+
+    Returns:
+    list: The (x, y, w, h) boxes of the detected license plates in pixels of the full resolution image.
+    """
+    # The cascade works on grayscale images, we only convert the region in which plates are searched for
+    x0, y0, x1, y1 = detection_region(img, camera)
+    search_img = cv2.cvtColor(img[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+
+    scale = 1.0
+    if DETECTION_MAX_WIDTH and search_img.shape[1] > DETECTION_MAX_WIDTH:
+        scale = DETECTION_MAX_WIDTH / search_img.shape[1]
+        search_img = cv2.resize(search_img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
 
     # Detection of license plates in the image
-    plate_rect = plate_cascade.detectMultiScale(plate_img, scaleFactor=1.3, minNeighbors=8)
+    plate_rect = recognizer.cascade.detectMultiScale(search_img, scaleFactor=SCALE_FACTOR, minNeighbors=MIN_NEIGHBORS)
 
-    # Initialize the plate variable before use
-    plate = None
+    # We map the boxes back to the full resolution image
+    boxes = []
+    for rect in plate_rect:
+        x, y, w, h = (int(round(v / scale)) for v in rect)
+        boxes.append((x + x0, y + y0, w, h))
+    return boxes
 
-    # Processing of each license plate detected
-    for (x, y, w, h) in plate_rect:
-        # We extract the license plate area for further processing
-        roi_ = roi[y:y + h, x:x + w, :]
-        plate = roi[y:y + h, x:x + w, :]
 
+def annotate_image(img, plate_rect, text=''):
+    """
+    The function draws the detected license plates and optionally a text on a copy of the image.
+
+    Parameters:
+    img (numpy.array): The image with the license plates.
+    plate_rect (list): The (x, y, w, h) boxes of the license plates.
+    text (str, optional): Text that can be added to the image around the license plate.
+
+    Returns:
+    numpy.array: The image with highlighted license plates and optionally added text.
+    """
+    plate_img = img.copy()  # We copy the input image for processing
+
+    for (x, y, w, h) in plate_rect:
         # We draw a rectangle around the license plate on the original image
         cv2.rectangle(plate_img, (x - 15, y), (x + w - 3, y + h - 5), (179, 206, 226), 3)
 
@@ -64,13 +115,38 @@ async def detect_plate(img, text=''):
         plate_img = cv2.putText(plate_img, text, (15, 15),
                                 cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 2, cv2.LINE_AA)
 
+    return plate_img
+
+
+def detect_plate(img, text='', camera=None):
+    """
+    The function is designed for detecting and processing license plates in an image.
+
+    Parameters:
+    img (numpy.array): The image in which the license plates need to be detected and processed.
+    text (str, optional): Text that can be added to the image around the license plate.
+    camera (str, optional): Identifier of the gate camera, used to restrict detection to its region of interest.
+
+    Returns:
+    numpy.array: The image with highlighted license plates and optionally added text.
+    numpy.array or None: The image of the license plate area for further processing, or None if the license plate was not detected.
+    """
+    plate_rect = find_plates(img, camera)
+
+    # We extract the license plate area for further processing (the last detected one)
+    plate = None
+    if plate_rect:
+        x, y, w, h = plate_rect[-1]
+        plate = img[y:y + h, x:x + w, :]
+
     # We return the processed image with selected license plates and the license plate area
-    return plate_img, plate
+    return annotate_image(img, plate_rect, text), plate
 
 
-async def find_contours(dimensions, img):
+def find_contours(dimensions, img):
     """
-    The function is designed for finding the contours of characters in a license plate image.
+    The function is designed for finding the contours of characters in a license plate image
+    and preparing all of them for the model in one pass.
 
     Parameters:
         dimensions (list): A list containing the set of dimensions for the character contours:
@@ -78,10 +154,11 @@ async def find_contours(dimensions, img):
         img (numpy.ndarray): The input image in which the character contours need to be found.
 
     Returns:
-        numpy.ndarray: An array containing the image of character contours, sorted by the x-coordinate.
+        numpy.ndarray: A float32 batch of model-ready character images with shape (N, 28, 28, 3),
+                       sorted by the x-coordinate.
     """
 
-    cntrs, _ = cv2.findContours(img.copy(), cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+    cntrs, _ = cv2.findContours(img, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
 
     lower_width = dimensions[0]
     upper_width = dimensions[1]
@@ -90,44 +167,31 @@ async def find_contours(dimensions, img):
 
     cntrs = sorted(cntrs, key=cv2.contourArea, reverse=True)[:15]
 
-    x_cntr_list = []
-    target_contours = []
-    img_res = []
-    for cntr in cntrs:
-        # Detect contour in binary image and return the coordinates of rectangle enclosing it
-        intX, intY, intWidth, intHeight = cv2.boundingRect(cntr)
+    # Rectangles enclosing the contours, filtered by the size of a character and sorted from left to right
+    rects = [cv2.boundingRect(cntr) for cntr in cntrs]
+    rects = sorted((rect for rect in rects
+                    if lower_width < rect[2] < upper_width and lower_height < rect[3] < upper_height),
+                   key=lambda rect: rect[0])
 
-        # Check the dimensions of the contour to filter out the characters by contour's size
-        if intWidth > lower_width and intWidth < upper_width and intHeight > lower_height and intHeight < upper_height:
-            x_cntr_list.append(
-                intX)  # Store the x coordinate of the character's contour, to be used later for indexing the contours
+    if not rects:
+        return np.zeros((0, 28, 28, 3), dtype=np.float32)
 
-            char_copy = np.zeros((44, 24))
-            # Extract each character using the enclosing rectangle's coordinates
-            char = img[intY:intY + intHeight, intX:intX + intWidth]
-            char = cv2.resize(char, (20, 40))
+    # All characters are drawn into one preallocated 44x24 canvas with a character per channel,
+    # each resized to 20x40 and surrounded by a 2 pixel black border
+    canvas = np.zeros((44, 24, len(rects)), dtype=np.float32)
+    for i, (intX, intY, intWidth, intHeight) in enumerate(rects):
+        canvas[2:42, 2:22, i] = cv2.resize(img[intY:intY + intHeight, intX:intX + intWidth], (20, 40))
 
-            # Make result formatted for classification: invert colors
-            char = cv2.subtract(255, char)
+    # Make result formatted for classification: invert colors
+    np.subtract(255, canvas[2:42, 2:22], out=canvas[2:42, 2:22])
 
-            # Resize the image to 24x44 with black border
-            char_copy[2:42, 2:22] = char
-            char_copy[0:2, :] = 0
-            char_copy[:, 0:2] = 0
-            char_copy[42:44, :] = 0
-            char_copy[:, 22:24] = 0
+    # One resize call handles every channel, i.e. every character at once
+    chars = cv2.resize(canvas, (28, 28), interpolation=cv2.INTER_AREA).reshape(28, 28, len(rects))
 
-            img_res.append(char_copy)  # List that stores the character's binary image (unsorted)
-    indices = sorted(range(len(x_cntr_list)), key=lambda k: x_cntr_list[k])
-    img_res_copy = []
-    for idx in indices:
-        img_res_copy.append(img_res[idx])  # Store character images according to their index
-    img_res = np.array(img_res_copy)
+    return fix_dimension(chars.transpose(2, 0, 1))
 
-    return img_res
 
-
-async def segment_characters(image):
+def segment_characters(image):
     """
     Finds characters in a license plate image.
 
@@ -135,7 +199,7 @@ async def segment_characters(image):
      - image: The license plate image from which characters will be extracted.
 
     Returns:
-     - char_list: A list of character contours found in the image.
+     - char_list: A batch of model-ready character images with shape (N, 28, 28, 3).
     """
 
     # We pre-process the license plate image
@@ -160,88 +224,225 @@ async def segment_characters(image):
                   LP_HEIGHT * HEIGH_LOWER,
                   LP_HEIGHT * HEIGH_UPPER]
 
-    char_list = await find_contours(dimensions, img_binary_lp)
+    char_list = find_contours(dimensions, img_binary_lp)
 
     return char_list
 
 
-async def fix_dimension(img):
+def fix_dimension(img):
     """
-    Function for resizing an image to dimensions (28, 28, 3).
+    Function for turning grayscale character images into the (28, 28, 3) input of the model.
 
     Parameters:
-    img (numpy.ndarray): The input image with dimensions (n, m), where n and m are integers.
+    img (numpy.ndarray): Character images with dimensions (..., 28, 28).
 
     Returns:
-    numpy.ndarray: An image with dimensions (28, 28, 3), where 3 is the number of channels (RGB).
+    numpy.ndarray: Images with dimensions (..., 28, 28, 3), where 3 is the number of channels (RGB).
     """
 
-    new_img = np.zeros((28, 28, 3))
-    for i in range(3):
-        new_img[:, :, i] = img
+    new_img = np.empty(img.shape + (3,), dtype=np.float32)
+    new_img[...] = img[..., np.newaxis]  # every channel gets the same grayscale image
     return new_img
 
 
-async def show_results(char):
+def classify_plate(char):
+    """
+    Function for recognizing the characters of a license plate together with the confidence of the result.
+
+    Parameters:
+    char (numpy.ndarray): A batch of license plate character images with shape (N, 28, 28, 3),
+                          as returned by segment_characters.
+
+    Returns:
+    str: The recognized license plate number.
+    float or None: The probability of the least certain character, None if there are no characters.
+    """
+
+    if len(char) == 0:
+        return '', None
+
+    y_proba = character_batcher.classify(char)  # we get probabilities for each class of each symbol
+    y_ = np.argmax(y_proba, axis=1)  # we choose the class with the highest probability
+    plate_number = ''.join(CHARACTERS[y] for y in y_)  # we combine the corresponding symbols into a line
+    confidence = float(y_proba[np.arange(len(y_)), y_].min())
+
+    return plate_number, confidence
+
+
+def show_results(char):
     """
     Function for displaying the results of character recognition on a license plate.
 
     Parameters:
-    char (list): A list of license plate character images.
+    char (numpy.ndarray): A batch of license plate character images with shape (N, 28, 28, 3),
+                          as returned by segment_characters.
 
     Returns:
     str: A string containing the recognized license plate number, composed of individual characters.
     """
 
-    dic = {}
-    characters = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
-    for i, c in enumerate(characters):
-        dic[i] = c
+    plate_number, _ = classify_plate(char)
 
-    output = []
-    for i, ch in enumerate(char):  # we iterate over the symbols
-        img_ = cv2.resize(ch, (28, 28), interpolation=cv2.INTER_AREA)
-        img = await fix_dimension(img_)
-        img = img.reshape(1, 28, 28, 3)  # image preparation for the model
-        y_proba = model.predict(img, verbose=0)[0]  # we get probabilities for each class
-        y_ = np.argmax(y_proba)  # we choose the class with the highest probability
-        character = dic[y_]  # we get a symbol corresponding to the predicted class
-        output.append(character)  # we save the result in the list
+    return plate_number
 
-    plate_number = ''.join(output)  # we combine all symbols into a line
 
-    return plate_number
+class ImageDecodeError(ValueError):
+    """
+    Raised when an uploaded photo is not a readable image, the only recognition error caused by the client.
+    """
 
 
-async def plate_recognize(photo):
+def read_image(photo):
     """
-    License plate recognition from an image.
+    Reads an image either from a file or from an in-memory encoded buffer.
 
-    :param photo: Path to the image of the car with a license plate.
-    :type photo: str
-    :return: A tuple containing the image with a bounding box around the license plate and the recognized characters.
+    Parameters:
+    photo (str | bytes | numpy.ndarray): Path to the image file (used by the batch tool), or the encoded
+                                         image bytes / 1-D uint8 buffer of an uploaded photo.
+
+    Returns:
+    numpy.ndarray: The decoded BGR image.
+
+    Raises:
+    ImageDecodeError: If the photo cannot be read or decoded.
+    """
+    if isinstance(photo, (str, os.PathLike)):
+        img = cv2.imread(os.fspath(photo))
+    else:
+        buffer = np.frombuffer(photo, dtype=np.uint8) if isinstance(photo, (bytes, bytearray, memoryview)) else photo
+        img = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+    if img is None:
+        raise ImageDecodeError("The photo could not be decoded as an image")
+    return img
+
+
+def encode_image(img):
+    """
+    Encodes an image in the configured output format, downscaled to at most OUTPUT_MAX_WIDTH pixels wide.
+
+    Parameters:
+    img (numpy.ndarray): The image to encode.
+
+    Returns:
+    bytes: The encoded image.
+    """
+    if OUTPUT_MAX_WIDTH and img.shape[1] > OUTPUT_MAX_WIDTH:
+        scale = OUTPUT_MAX_WIDTH / img.shape[1]
+        img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    if OUTPUT_FORMAT in ('jpg', 'jpeg'):
+        params = [cv2.IMWRITE_JPEG_QUALITY, OUTPUT_QUALITY]
+    elif OUTPUT_FORMAT == 'webp':
+        params = [cv2.IMWRITE_WEBP_QUALITY, OUTPUT_QUALITY]
+    else:
+        params = []
+
+    _, img_buffer = cv2.imencode(f'.{OUTPUT_FORMAT}', img, params)
+    return img_buffer.tobytes()
+
+
+def read_plate(photo, timings=None, camera=None):
+    """
+    Reads the license plate number from an image without drawing or encoding anything.
+
+    :param photo: Encoded image bytes / buffer of the car with a license plate, or a path to the image file.
+    :type photo: bytes | numpy.ndarray | str
+    :param timings: Optional dictionary that receives the duration in seconds of every stage
+                    (decode, detect, segment, classify).
+    :type timings: dict | None
+    :param camera: Optional identifier of the gate camera, used to restrict detection to its region of interest.
+    :type camera: str | None
+    :return: A tuple of the decoded image, the (x, y, w, h) boxes of the detected plates and the recognized characters.
     :rtype: tuple
     """
+    if timings is None:
+        timings = {}
+
+    start = time.perf_counter()
+    img = read_image(photo)
+    timings['decode'] = time.perf_counter() - start
+
+    # License plate detection in the image
+    start = time.perf_counter()
+    plate_rect = find_plates(img, camera)
+    timings['detect'] = time.perf_counter() - start
+
+    if not plate_rect:
+        return img, plate_rect, None
+
+    x, y, w, h = plate_rect[-1]
+    plate = img[y:y + h, x:x + w, :]
+
+    start = time.perf_counter()
+    char = segment_characters(plate)  # Identification of license plate symbols
+    timings['segment'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    recognized_symbols = show_results(char)  # Recognition of license plate symbols
+    timings['classify'] = time.perf_counter() - start
+
+    return img, plate_rect, recognized_symbols
+
+
+def render_plate_image(photo, plate_rect, text=''):
+    """
+    Draws the detected license plates and the text on a photo and encodes it in the output format.
+    Used when annotation is deferred until after the gate has been answered.
+
+    :param photo: Encoded image bytes / buffer of the car with a license plate, or a path to the image file.
+    :type photo: bytes | numpy.ndarray | str
+    :param plate_rect: The (x, y, w, h) boxes of the detected plates, as returned by read_plate.
+    :type plate_rect: list
+    :param text: Text that is added to the image, e.g. the date and time of the entry.
+    :type text: str
+    :return: The encoded annotated image.
+    :rtype: bytes
+    """
+    return encode_image(annotate_image(read_image(photo), plate_rect, text))
 
-    img = cv2.imread(photo)
+
+def recognize_plate(photo, timings=None, camera=None):
+    """
+    License plate recognition from an image. This is a blocking function, in the API it is run by
+    the recognition worker pool (src.services.recognition) so that it does not stall the event loop.
+
+    :param photo: Encoded image bytes / buffer of the car with a license plate, or a path to the image file.
+    :type photo: bytes | numpy.ndarray | str
+    :param timings: Optional dictionary that receives the duration in seconds of every stage
+                    (decode, detect, segment, classify, encode).
+    :type timings: dict | None
+    :param camera: Optional identifier of the gate camera, used to restrict detection to its region of interest.
+    :type camera: str | None
+    :return: A tuple containing the image with a bounding box around the license plate and the recognized characters.
+    :rtype: tuple
+    """
+    if timings is None:
+        timings = {}
 
     current_datetime = datetime.now()
     current_datetime_str = current_datetime.strftime("%Y-%m-%d %H:%M:%S")
 
-    # License plate detection in the image
-    output_img, plate = await detect_plate(img, text=current_datetime_str)
+    img, plate_rect, recognized_symbols = read_plate(photo, timings, camera)
 
     # Converting the image to the selected format
-    _, img_buffer = cv2.imencode(f'.{OUTPUT_FORMAT}', output_img)
-    img_bytes = img_buffer.tobytes()
+    start = time.perf_counter()
+    img_bytes = encode_image(annotate_image(img, plate_rect, current_datetime_str))
+    timings['encode'] = time.perf_counter() - start
+
+    return img_bytes, recognized_symbols
 
-    if plate is None:
-        return img_bytes, None
 
-    char = await segment_characters(plate)  # Identification of license plate symbols
-    recognized_symbols = await show_results(char)  # Recognition of license plate symbols
+async def plate_recognize(photo):
+    """
+    License plate recognition from an image without blocking the event loop.
 
-    return img_bytes, recognized_symbols
+    :param photo: Encoded image bytes / buffer of the car with a license plate, or a path to the image file.
+    :type photo: bytes | numpy.ndarray | str
+    :return: A tuple containing the image with a bounding box around the license plate and the recognized characters.
+    :rtype: tuple
+    """
+    return await asyncio.to_thread(recognize_plate, photo)
 
 
 async def main():
@@ -0,0 +1,91 @@
+import threading
+
+import cv2
+import numpy as np
+
+from DS.functions.backends import load_backend
+from DS.functions.configuration import CASCADE_ClASIFIER, MODEL, ONNX_MODEL, NUMPY_MODEL, INFERENCE_BACKEND
+
+MODEL_PATHS = {
+    'keras': MODEL,
+    'onnx': ONNX_MODEL,
+    'numpy': NUMPY_MODEL,
+}
+
+
+class RecognizerRegistry:
+    """
+    Holds the Haar cascade (one per thread) and the character model backend shared by the recognition pipeline.
+
+    Nothing is loaded on import: the cascade and the model are loaded on first use or by an
+    explicit call to warmup(), so importing the API (or tools that import it) does not pay
+    the model runtime startup cost.
+
+    Parameters:
+    cascade_path (str): Path to the XML file of the Haar cascade classifier.
+    backend_name (str): Inference backend of the character model: 'keras', 'onnx' or 'numpy'.
+    model_path (str): Path to the character recognition model file of that backend.
+    """
+
+    def __init__(self, cascade_path, backend_name, model_path):
+        self.cascade_path = cascade_path
+        self.backend_name = backend_name
+        self.model_path = model_path
+        self._thread_local = threading.local()
+        self._backend = None
+        self._ready = False
+        self._lock = threading.Lock()
+
+    @property
+    def cascade(self):
+        """
+        A cv2.CascadeClassifier must not run detectMultiScale from several threads at once,
+        so every thread of the recognition pool gets its own copy of the cascade.
+
+        Returns:
+        cv2.CascadeClassifier: The license plate cascade of the calling thread, loaded on first access.
+        """
+        cascade = getattr(self._thread_local, 'cascade', None)
+        if cascade is None:
+            cascade = cv2.CascadeClassifier(self.cascade_path)
+            if cascade.empty():
+                raise RuntimeError(f"Could not load the Haar cascade from {self.cascade_path}")
+            self._thread_local.cascade = cascade
+        return cascade
+
+    @property
+    def backend(self):
+        """
+        Returns:
+        KerasBackend | OnnxBackend | NumpyBackend: The character model backend, loaded on first access.
+        """
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = load_backend(self.backend_name, self.model_path)
+        return self._backend
+
+    @property
+    def ready(self):
+        """
+        Returns:
+        bool: True once the cascade and the model are loaded and the model has run a warmup inference.
+        """
+        return self._ready
+
+    def warmup(self):
+        """
+        Loads the cascade and the model and runs a dummy inference, so the first real request
+        does not pay for building and tracing the prediction graph.
+
+        Returns:
+        None
+        """
+        if self._ready:
+            return
+        _ = self.cascade
+        self.backend.predict(np.zeros((1, 28, 28, 3), dtype=np.float32))
+        self._ready = True
+
+
+recognizer = RecognizerRegistry(CASCADE_ClASIFIER, INFERENCE_BACKEND, MODEL_PATHS.get(INFERENCE_BACKEND, MODEL))
@@ -1,9 +1,11 @@
 import asyncio
+import logging
 import os
 from pathlib import Path
 import uvicorn
 
 from fastapi import FastAPI, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
@@ -11,8 +13,14 @@ from fastapi.middleware.cors import CORSMiddleware
 
 # from src.services.telegram_sender import run_bot
 
-from src.database.db import get_db
+from src.conf.config import config
+from src.database.db import get_db, sessionmanager
+from src.repository.occupancy import reconcile_occupancy
 from src.routes import auth, users, history, image, parking, admin
+from src.services.metrics import metrics
+from src.services.pagination import NEXT_CURSOR_HEADER
+from src.services.recognition import recognition_service
+from src.services.upload_queue import upload_queue
 
 app = FastAPI(title="ParkSense AI", description="Welcome to ParkSense AI API",
               swagger_ui_parameters={"syntaxHighlight.theme": "obsidian"})
@@ -37,6 +45,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 @app.get("/api/healthchecker", tags=['Health checker'])
@@ -46,16 +55,53 @@ async def healthchecker(db: AsyncSession = Depends(get_db)):
         result = result.fetchone()
         if result is None:
             raise HTTPException(status_code=500, detail="Database is not configured correctly")
-        return {"message": "Welcome to FastAPI!"}
+        return {"message": "Welcome to FastAPI!", "recognition_ready": recognition_service.ready}
     except Exception as e:
         print(e)
         raise HTTPException(status_code=500, detail="Error connecting to the database")
 
 
+@app.get("/metrics", tags=['Health checker'], response_class=PlainTextResponse)
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 # @app.on_event("startup")
 # async def startup_event():
 #     asyncio.create_task(run_bot())
 
 
+warmup_task = None
+
+
+@app.on_event("startup")
+async def startup_event():
+    # The recognition model is loaded in the background, the API accepts requests right away
+    # and the health checker reports when recognition is ready
+    global warmup_task
+    if config.RECOGNITION_WARMUP:
+        warmup_task = asyncio.create_task(recognition_service.warmup())
+    # Images spooled but not uploaded before the last shutdown are uploaded now
+    await upload_queue.start()
+    # The occupancy counter can be checked against the open parking sessions on startup (off by default,
+    # every worker would run it); POST /api/admin/occupancy/reconcile does it on demand
+    if config.RECONCILE_OCCUPANCY_ON_STARTUP:
+        try:
+            async with sessionmanager.session() as session:
+                await reconcile_occupancy(session)
+                await session.commit()
+        except Exception:
+            logging.exception("Occupancy reconciliation failed")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    await upload_queue.stop()
+    await recognition_service.shutdown()
+    await sessionmanager.close()
+
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=int(os.environ.get("PORT", 8000)), log_level="info")
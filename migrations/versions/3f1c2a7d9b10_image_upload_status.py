@@ -0,0 +1,30 @@
+"""Image_upload_status
+
+Revision ID: 3f1c2a7d9b10
+Revises: 90c60ceb3d90
+Create Date: 2026-10-18 10:12:41.518230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c2a7d9b10'
+down_revision: Union[str, None] = '90c60ceb3d90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+upload_status = sa.Enum('pending', 'uploaded', 'failed', name='uploadstatus')
+
+
+def upgrade() -> None:
+    upload_status.create(op.get_bind(), checkfirst=True)
+    op.add_column('images', sa.Column('upload_status', upload_status, server_default='uploaded', nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('images', 'upload_status')
+    upload_status.drop(op.get_bind(), checkfirst=True)
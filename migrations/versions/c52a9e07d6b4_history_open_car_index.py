@@ -0,0 +1,30 @@
+"""History_open_car_index
+
+Revision ID: c52a9e07d6b4
+Revises: b7e4d2c81f35
+Create Date: 2026-10-18 11:42:03.877150
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c52a9e07d6b4'
+down_revision: Union[str, None] = 'b7e4d2c81f35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Built concurrently, so the gates keep working while the index is created on a large history table
+    with op.get_context().autocommit_block():
+        op.create_index('ix_history_open_car_id', 'history', ['car_id', 'entry_time'], unique=False,
+                        postgresql_where=sa.text('exit_time IS NULL'), postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_history_open_car_id', table_name='history', postgresql_concurrently=True)
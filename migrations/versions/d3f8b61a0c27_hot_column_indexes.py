@@ -0,0 +1,42 @@
+"""Hot_column_indexes
+
+Revision ID: d3f8b61a0c27
+Revises: c52a9e07d6b4
+Create Date: 2026-10-18 12:20:45.390512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3f8b61a0c27'
+down_revision: Union[str, None] = 'c52a9e07d6b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ('ix_history_entry_time', 'history', ['entry_time'], None),
+    ('ix_history_exit_time', 'history', ['exit_time'], None),
+    ('ix_history_car_id', 'history', ['car_id'], None),
+    ('ix_history_unpaid_car_id', 'history', ['car_id'], 'NOT paid'),
+    ('ix_images_current_plate', 'images', ['current_plate'], None),
+    ('ix_parking_rates_created_at', 'parking_rates', ['created_at'], None),
+    ('ix_blacklist_token', 'blacklist', ['token'], None),
+]
+
+
+def upgrade() -> None:
+    # Built concurrently, so the gates keep working while the indexes are created
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True,
+                            postgresql_where=sa.text(where) if where else None)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
@@ -1,15 +1,90 @@
 import contextlib
+import logging
+import math
+import time
 
+from sqlalchemy import make_url, text
 from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from src.conf.config import config
+from src.services.metrics import db_pool_wait_seconds, metrics
+
+REPLICA_CHECK_INTERVAL = 5  # seconds the measured replica lag is reused before it is queried again
+
+# Replication state of the read database: whether it is a replica, whether it has replayed all the WAL it
+# received, whether its WAL receiver is streaming from the primary (NULL when the status is not visible to
+# the database user) and the age in seconds of its last replayed transaction
+REPLICA_STATUS_QUERY = text(
+    "SELECT pg_is_in_recovery(), pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn(), "
+    "EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming'), "
+    "EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())::float8"
+)
+
+
+def replica_lag(in_recovery: bool, caught_up: bool | None, streaming: bool | None,
+                replay_age: float | None) -> float:
+    """
+    The replica_lag function tells how many seconds the read database is behind the primary,
+    from the row of REPLICA_STATUS_QUERY.
+    It is 0 for a database that is not a replica, and for a replica that streams from the primary and has
+    replayed everything it received. Having replayed everything received says nothing once the replica
+    stopped streaming, then it is as far behind as its last replayed transaction, infinitely if there is none.
+
+    :param in_recovery: bool: The database is a replica
+    :param caught_up: bool | None: The replica has replayed all the WAL it received
+    :param streaming: bool | None: The WAL receiver of the replica is streaming
+    :param replay_age: float | None: Seconds since the last replayed transaction
+    :return: The lag in seconds
+    """
+    if not in_recovery or (caught_up and streaming):
+        return 0.0
+    return replay_age if replay_age is not None else math.inf
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    # Records how long every checkout waited for a free connection (or for a new one to connect)
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_wait_seconds.observe(time.perf_counter() - start)
+
+
+def create_engine(url: str) -> AsyncEngine:
+    """
+    The create_engine function creates the async engine with the pool settings from the config.
+    SQLite, used in tests, keeps the default pool of its driver.
+
+    :param url: str: The database url
+    :return: The async engine
+    """
+    url = make_url(url)
+    options = {}
+    if url.get_backend_name() != "sqlite":
+        options.update(poolclass=TimedQueuePool, pool_size=config.DB_POOL_SIZE, max_overflow=config.DB_MAX_OVERFLOW,
+                       pool_timeout=config.DB_POOL_TIMEOUT, pool_recycle=config.DB_POOL_RECYCLE,
+                       pool_pre_ping=config.DB_POOL_PRE_PING)
+    if url.get_driver_name() == "asyncpg":
+        # SQLAlchemy keeps its own cache of prepared statements on top of the one of asyncpg, both are sized
+        url = url.update_query_dict({"prepared_statement_cache_size": str(config.DB_STATEMENT_CACHE_SIZE)})
+        options.update(connect_args={"statement_cache_size": config.DB_STATEMENT_CACHE_SIZE})
+    return create_async_engine(url, **options)
 
 
 class DatabaseSessionManager:
-    def __init__(self, url: str):
-        self._engine: AsyncEngine | None = create_async_engine(url)
+    def __init__(self, url: str, read_url: str | None = None, max_replica_lag: float = 30):
+        self._engine: AsyncEngine | None = create_engine(url)
         self._session_maker: async_sessionmaker = async_sessionmaker(autoflush=False, autocommit=False,
                                                                      bind=self._engine)
+        # Optional read-only replica for reporting and listing queries, see read_session
+        self._read_engine: AsyncEngine | None = create_engine(read_url) if read_url else None
+        self._read_session_maker: async_sessionmaker | None = async_sessionmaker(
+            autoflush=False, autocommit=False, bind=self._read_engine) if read_url else None
+        self.max_replica_lag = max_replica_lag
+        self._replica_usable = False
+        self._replica_checked_at: float | None = None
 
     @contextlib.asynccontextmanager
     async def session(self):
@@ -17,6 +92,7 @@ class DatabaseSessionManager:
         The session function is a coroutine that returns an async context manager.
         The context manager yields a database session, and then closes it when the
         context ends. The session can be used to execute queries and transactions.
+        An exception raised inside the context rolls the session back and is raised again.
 
         :param self: Represent the instance of the class
         :return: A context manager
@@ -26,14 +102,106 @@ class DatabaseSessionManager:
         session = self._session_maker()
         try:
             yield session
+        except Exception:
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
+
+    async def _check_replica(self) -> bool:
+        """
+        The _check_replica function tells whether the replica is reachable and no more than
+        max_replica_lag seconds behind the primary. The answer is reused for REPLICA_CHECK_INTERVAL seconds.
+
+        :param self: Represent the instance of the class
+        :return: True if reads may go to the replica
+        """
+        now = time.monotonic()
+        if self._replica_checked_at is not None and now - self._replica_checked_at < REPLICA_CHECK_INTERVAL:
+            return self._replica_usable
+        try:
+            lag = await self._replica_lag()
+            self._replica_usable = lag <= self.max_replica_lag
+            if not self._replica_usable:
+                logging.warning(f"Read replica is {lag:.0f}s behind, reading from the primary")
         except Exception as err:
-            print(err)
+            logging.warning(f"Read replica is not available, reading from the primary: {err}")
+            self._replica_usable = False
+        self._replica_checked_at = now
+        return self._replica_usable
+
+    async def _replica_lag(self) -> float:
+        async with self._read_engine.connect() as connection:
+            if self._read_engine.dialect.name != "postgresql":
+                # A stand-in for the replica, e.g. the SQLite file of the tests, only has to be reachable
+                await connection.execute(text("SELECT 1"))
+                return 0.0
+            return replica_lag(*(await connection.execute(REPLICA_STATUS_QUERY)).one())
+
+    @contextlib.asynccontextmanager
+    async def read_session(self):
+        """
+        The read_session function is an async context manager like session, for read-only queries.
+        The session is bound to the read replica when one is configured, reachable and not lagging
+        more than max_replica_lag seconds behind, otherwise to the primary.
+
+        :param self: Represent the instance of the class
+        :return: A context manager
+        """
+        if self._read_session_maker is None or not await self._check_replica():
+            async with self.session() as session:
+                yield session
+            return
+        session = self._read_session_maker()
+        try:
+            yield session
+        except Exception:
             await session.rollback()
+            raise
         finally:
             await session.close()
 
+    def pool_status(self) -> dict:
+        """
+        The pool_status function reports the utilisation of the connection pool.
+
+        :param self: Represent the instance of the class
+        :return: A dict of the pool size, the checked out and idle connections and the current overflow,
+            empty for a pool without these counters
+        """
+        pool = self._engine.pool if self._engine is not None else None
+        if not isinstance(pool, AsyncAdaptedQueuePool):
+            return {}
+        return {"size": pool.size(), "checked_out": pool.checkedout(), "idle": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0)}
+
+    async def close(self):
+        """
+        The close function closes all connections of the pools, it is called on shutdown.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        if self._read_engine is not None:
+            await self._read_engine.dispose()
+            self._read_engine = None
+            self._read_session_maker = None
+        if self._engine is None:
+            return
+        await self._engine.dispose()
+        self._engine = None
+        self._session_maker = None
 
-sessionmanager = DatabaseSessionManager(config.SQLALCHEMY_DATABASE_URL)
+
+sessionmanager = DatabaseSessionManager(config.SQLALCHEMY_DATABASE_URL, config.SQLALCHEMY_READ_DATABASE_URL,
+                                        config.READ_REPLICA_MAX_LAG)
+
+for _state, _documentation in (("size", "Number of connections the pool keeps open"),
+                               ("checked_out", "Number of database connections in use"),
+                               ("idle", "Number of idle database connections in the pool"),
+                               ("overflow", "Number of connections opened above the pool size")):
+    metrics.gauge(f"parksense_db_pool_{_state}", _documentation,
+                  lambda state=_state: sessionmanager.pool_status().get(state, 0))
 
 
 async def get_db():
@@ -47,3 +215,14 @@ async def get_db():
     """
     async with sessionmanager.session() as session:
         yield session
+
+
+async def get_read_db():
+    """
+    The get_read_db function is the read-only counterpart of get_db for reporting and listing routes.
+    It yields a session of the read replica, or of the primary when there is no usable replica.
+
+    :return: A generator object
+    """
+    async with sessionmanager.read_session() as session:
+        yield session
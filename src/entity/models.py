@@ -2,7 +2,7 @@ import enum
 from datetime import date
 from typing import List
 
-from sqlalchemy import String, func, DateTime, Enum, ForeignKey, Table, Integer, Float, Column
+from sqlalchemy import String, func, DateTime, Enum, ForeignKey, Table, Integer, Float, Column, Index, text
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 
@@ -15,6 +15,12 @@ class Role(enum.Enum):
     user: str = "user"
 
 
+class UploadStatus(enum.Enum):
+    pending: str = "pending"
+    uploaded: str = "uploaded"
+    failed: str = "failed"
+
+
 user_car_association = Table(
     "user_car_association", Base.metadata,
     Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE")),
@@ -46,10 +52,10 @@ class User(JoinTime, Base):
     chat_id: Mapped[str] = mapped_column(String(150), unique=False, nullable=True)
     
     blacklist_tokens: Mapped["Blacklist"] = relationship(
-        "Blacklist", back_populates="user", lazy="joined", uselist=True
+        "Blacklist", back_populates="user", lazy="select", uselist=True
     )
     cars: Mapped[List["Car"]] = relationship(
-        secondary=user_car_association, back_populates="users", lazy="joined"
+        secondary=user_car_association, back_populates="users", lazy="select"
     )
 
 # class Token(Base):
@@ -63,20 +69,22 @@ class User(JoinTime, Base):
 
 class Blacklist(JoinTime, Base):
     __tablename__ = "blacklist"
-    token: Mapped[str] = mapped_column(String(255), nullable=True)
+    token: Mapped[str] = mapped_column(String(255), nullable=True, index=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=True)
     user: Mapped["User"] = relationship("User", back_populates="blacklist_tokens",
-                                        lazy="joined", cascade="all, delete")
+                                        lazy="select", cascade="all, delete")
 
 
 class Image(JoinTime, Base):
     __tablename__ = "images"
     url: Mapped[str] = mapped_column(String(255), nullable=False)
-    current_plate: Mapped[str] = mapped_column(String(25), nullable=False, unique=False)
+    current_plate: Mapped[str] = mapped_column(String(25), nullable=False, unique=False, index=True)
     cloudinary_public_id: Mapped[str] = mapped_column(String, nullable=False)
+    upload_status: Mapped[Enum] = mapped_column('upload_status', Enum(UploadStatus), default=UploadStatus.uploaded,
+                                                server_default=UploadStatus.uploaded.value, nullable=True)
 
     history: Mapped["History"] = relationship(
-        "History", back_populates="image", lazy="joined", cascade="all, delete"
+        "History", back_populates="image", lazy="select", cascade="all, delete"
     )
 
 
@@ -88,37 +96,54 @@ class Car(JoinTime, Base):
     ban: Mapped[bool] = mapped_column(default=False, nullable=True)
 
     history: Mapped["History"] = relationship(
-        "History", back_populates="car", lazy="joined", cascade="all, delete"
+        "History", back_populates="car", lazy="select", cascade="all, delete"
     )
     users: Mapped[List["User"]] = relationship(
-        secondary=user_car_association, back_populates="cars", lazy="joined"
+        secondary=user_car_association, back_populates="cars", lazy="select"
     )
 
 
 class ParkingRate(JoinTime, Base):
     __tablename__ = "parking_rates"
+    __table_args__ = (
+        # The latest rate and the rate valid at an entry time are looked up on every gate event
+        Index("ix_parking_rates_created_at", "created_at"),
+    )
     rate_per_hour: Mapped[float] = mapped_column(Float, default=5.0, nullable=True)
     rate_per_day: Mapped[float] = mapped_column(Float, default=50.0, nullable=True)
     number_of_spaces: Mapped[int] = mapped_column(Integer, default=50, nullable=True)
     history: Mapped["History"] = relationship("History", back_populates="rates",
-                                              lazy="joined", cascade="all, delete", uselist=True)
+                                              lazy="select", cascade="all, delete", uselist=True)
 
 
 class History(JoinTime, Base):
     __tablename__ = "history"
-    entry_time: Mapped[DateTime] = mapped_column(DateTime, nullable=True)
-    exit_time: Mapped[DateTime] = mapped_column(DateTime, nullable=True)
+    __table_args__ = (
+        # Open parking session of a car, looked up on every exit
+        Index("ix_history_open_car_id", "car_id", "entry_time", postgresql_where=text("exit_time IS NULL"),
+              sqlite_where=text("exit_time IS NULL")),
+        # Unpaid parking sessions, a small part of the table. SQLite, used in tests, only uses a partial index
+        # for a query with the same condition, and paid == False is rendered as paid = 0 there
+        Index("ix_history_unpaid_car_id", "car_id", postgresql_where=text("NOT paid"), sqlite_where=text("paid = 0")),
+    )
+    entry_time: Mapped[DateTime] = mapped_column(DateTime, nullable=True, index=True)
+    exit_time: Mapped[DateTime] = mapped_column(DateTime, nullable=True, index=True)
     parking_time: Mapped[float] = mapped_column(Float, nullable=True)
     cost: Mapped[float] = mapped_column(Float, nullable=True)
     paid: Mapped[bool] = mapped_column(default=False, nullable=True)
     number_free_spaces: Mapped[int] = mapped_column(Integer, nullable=True)
-    car_id: Mapped[int] = mapped_column(Integer, ForeignKey("cars.id"), nullable=True)
+    car_id: Mapped[int] = mapped_column(Integer, ForeignKey("cars.id"), nullable=True, index=True)
     image_id: Mapped[int] = mapped_column(Integer, ForeignKey("images.id"), nullable=True)
     rate_id: Mapped[int] = mapped_column(Integer, ForeignKey("parking_rates.id"), nullable=True)
 
-    car: Mapped["Car"] = relationship("Car", back_populates="history", lazy="joined",
+    car: Mapped["Car"] = relationship("Car", back_populates="history", lazy="select",
                                       cascade="all, delete")
-    image: Mapped["Image"] = relationship("Image", back_populates="history", lazy="joined",
+    image: Mapped["Image"] = relationship("Image", back_populates="history", lazy="select",
                                             cascade="all, delete")
-    rates: Mapped["ParkingRate"] = relationship("ParkingRate", back_populates="history", lazy="joined",
+    rates: Mapped["ParkingRate"] = relationship("ParkingRate", back_populates="history", lazy="select",
                                                 cascade="all, delete")
+
+
+class Occupancy(JoinTime, Base):
+    __tablename__ = "occupancy"
+    occupied: Mapped[int] = mapped_column(Integer, nullable=False, default=0)  # Parked cars (open History rows)
@@ -1,11 +1,16 @@
+from typing import Sequence
+
 from fastapi import HTTPException, status
 from sqlalchemy import select, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
-from src.schemas.car import CarModel, CarUpdate
+from src.schemas.car import CarModel, CarUpdate, NewCarResponse
 from src.entity.models import Car, User, user_car_association, History
 
+#Fields of the car lists
+CAR_LIST_FIELDS = tuple(NewCarResponse.model_fields)
+
 
 class CarRepository:
     def __init__(self, db_session: AsyncSession):
@@ -43,24 +48,49 @@ class CarRepository:
             car.user_ids = [user.id for user in car.users]
         return car
 
-    async def get_all_cars(self):
-        result = await self.db.execute(select(Car).options(selectinload(Car.users)))
-        cars = result.scalars().unique().all()
-        if cars:
-            for car in cars:
-                car.user_ids = [user.id for user in car.users]
-        return cars
-
-    async def get_cars_currently_parked(self):
-        result = await self.db.execute(
-            select(Car).join(History, Car.id == History.car_id)
-            .where(History.entry_time.isnot(None))
-            .where(History.exit_time.is_(None))
-        )
-        cars = result.scalars().unique().all()
-        if cars:
+    async def get_all_cars(self, after_id: int | None = None, limit: int | None = None,
+                           fields: Sequence[str] | None = None):
+        return await self.list_cars(None, after_id, limit, fields)
+
+    async def get_cars_currently_parked(self, after_id: int | None = None, limit: int | None = None,
+                                        fields: Sequence[str] | None = None):
+        parked_car_ids = select(History.car_id).where(History.entry_time.isnot(None)).where(History.exit_time.is_(None))
+        return await self.list_cars(Car.id.in_(parked_car_ids), after_id, limit, fields)
+
+    async def list_cars(self, condition=None, after_id: int | None = None, limit: int | None = None,
+                        fields: Sequence[str] | None = None) -> list[dict]:
+        """
+        The list_cars function reads a page of the cars matching a condition in id order after the given id
+        (keyset pagination). Only the requested columns are selected, the ids of the owners are read
+        with one more query and only if user_ids is requested.
+
+        :param self: Represent the instance of the class
+        :param condition: The filter of the list, all cars if None
+        :param after_id: int | None: Id of the last car of the previous page
+        :param limit: int | None: Maximum number of cars, all cars if None
+        :param fields: Sequence[str] | None: Names of CAR_LIST_FIELDS to return, all if None
+        :return: The cars as dicts, always with the id
+        """
+        fields = list(fields or CAR_LIST_FIELDS)
+        columns = [Car.id] + [getattr(Car, name) for name in fields if name not in ("id", "user_ids")]
+        query = select(*columns)
+        if condition is not None:
+            query = query.where(condition)
+        if after_id is not None:
+            query = query.where(Car.id > after_id)
+        result = await self.db.execute(query.order_by(Car.id).limit(limit))
+        cars = [dict(row) for row in result.mappings()]
+
+        if "user_ids" in fields and cars:
             for car in cars:
-                car.user_ids = [user.id for user in car.users]
+                car["user_ids"] = []
+            cars_by_id = {car["id"]: car for car in cars}
+            owners = await self.db.execute(
+                select(user_car_association.c.car_id, user_car_association.c.user_id)
+                .where(user_car_association.c.car_id.in_(cars_by_id))
+            )
+            for car_id, user_id in owners:
+                cars_by_id[car_id]["user_ids"].append(user_id)
         return cars
 
     async def get_cars_by_user(self, user_id: int):
@@ -82,7 +112,7 @@ class CarRepository:
         return users
 
     async def update_car(self, plate: str, car_update: CarUpdate):
-        statement = select(Car).where(Car.plate == plate)
+        statement = select(Car).options(selectinload(Car.users)).where(Car.plate == plate)
         result = await self.db.execute(statement)
         car = result.scalars().first()
         if not car:
@@ -108,9 +138,10 @@ class CarRepository:
         for var, value in car_update.dict(exclude_unset=True, exclude={'user_ids'}).items():
             setattr(car, var, value)
 
+        user_ids = [user.id for user in car.users]  # We write user IDs in the list
         await self.db.commit()
         await self.db.refresh(car)
-        car.user_ids = [user.id for user in car.users]  # We write user IDs in the list
+        car.user_ids = user_ids
         return car
 
     async def delete_car(self, plate: str):
@@ -0,0 +1,153 @@
+from datetime import datetime
+from typing import Tuple
+
+from sqlalchemy import Row, desc, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.entity.models import Car, History, Image, ParkingRate, UploadStatus
+from src.repository.history import calculate_parking_cost, calculate_parking_duration
+from src.repository.occupancy import change_occupancy
+
+
+def count_free_spaces(number_of_spaces: int, occupied: int) -> int:
+    number_free_spaces = number_of_spaces - occupied
+    if number_free_spaces == 0:
+        number_free_spaces = 100
+    return number_free_spaces
+
+
+async def get_gate_state(session: AsyncSession, plate: str | None = None) -> Tuple[int | None, int, int | None]:
+    """
+    The get_gate_state function reads the latest parking rate and the id of the car with the given plate
+    in one statement.
+
+    :param session: AsyncSession: The session of the gate event transaction
+    :param plate: str | None: The license plate of the car at the gate
+    :return: A tuple of the id of the latest parking rate (None if there is none), its number of spaces
+        and the id of the car (None if it is not registered)
+    """
+    latest_rate = select(ParkingRate.id, ParkingRate.number_of_spaces) \
+        .order_by(desc(ParkingRate.created_at)).limit(1).subquery()
+    car_id = select(Car.id).where(Car.plate == plate).scalar_subquery()
+
+    stmt = select(select(latest_rate.c.id).scalar_subquery(),
+                  select(latest_rate.c.number_of_spaces).scalar_subquery(),
+                  car_id)
+    rate_id, number_of_spaces, car_id = (await session.execute(stmt)).one()
+    return rate_id, number_of_spaces or 0, car_id
+
+
+async def insert_image(session: AsyncSession, current_plate: str, url: str, cloudinary_public_id: str,
+                       upload_status: UploadStatus) -> int:
+    stmt = insert(Image).values(current_plate=current_plate, url=url, cloudinary_public_id=cloudinary_public_id,
+                                upload_status=upload_status).returning(Image.id)
+    return (await session.execute(stmt)).scalar_one()
+
+
+async def record_entry(session: AsyncSession, plate: str, url: str, cloudinary_public_id: str,
+                       upload_status: UploadStatus = UploadStatus.uploaded) -> Tuple[int, Row]:
+    """
+    The record_entry function writes the Image and the History rows of a car entering the parking
+    in a single transaction: one read of the rate and car, the occupancy counter increment
+    and two INSERT ... RETURNING statements.
+
+    :param session: AsyncSession: The database session
+    :param plate: str: The recognized or manually entered license plate
+    :param url: str: Url of the gate photo, empty while the upload is pending
+    :param cloudinary_public_id: str: Storage id of the gate photo
+    :param upload_status: UploadStatus: Whether the gate photo is already uploaded
+    :return: A tuple of the id of the Image row and the columns of the new History row
+    """
+    entry_time = datetime.now()
+    rate_id, number_of_spaces, car_id = await get_gate_state(session, plate)
+    occupied = await change_occupancy(session, 1)
+    number_free_spaces = count_free_spaces(number_of_spaces, occupied - 1) - 1
+
+    image_id = await insert_image(session, plate, url, cloudinary_public_id, upload_status)
+    stmt = insert(History).values(entry_time=entry_time, car_id=car_id, image_id=image_id,
+                                  number_free_spaces=number_free_spaces, rate_id=rate_id,
+                                  exit_time=None).returning(*History.__table__.c)
+    history = (await session.execute(stmt)).one()
+
+    await session.commit()
+    return image_id, history
+
+
+async def record_exit(session: AsyncSession, plate: str, url: str, cloudinary_public_id: str,
+                      upload_status: UploadStatus = UploadStatus.uploaded) -> Tuple[int, Row | None]:
+    """
+    The record_exit function writes the Image row of a car leaving the parking and closes its open
+    parking session in a single transaction. The car, its open session and the parking rates valid
+    at the entry time are read in one statement.
+
+    :param session: AsyncSession: The database session
+    :param plate: str: The recognized or manually entered license plate
+    :param url: str: Url of the gate photo, empty while the upload is pending
+    :param cloudinary_public_id: str: Storage id of the gate photo
+    :param upload_status: UploadStatus: Whether the gate photo is already uploaded
+    :return: A tuple of the id of the Image row and the columns of the closed History row,
+        None if a registered car has no open parking session or it was closed by a concurrent exit
+    """
+    exit_time = datetime.now()
+    rate_id, number_of_spaces, _ = await get_gate_state(session)
+
+    def rate_at_entry(column):
+        return select(column).where(ParkingRate.created_at <= History.entry_time) \
+            .order_by(ParkingRate.created_at.desc()).limit(1).correlate(History).scalar_subquery()
+
+    stmt = select(Car.id, Car.credit, History.id, History.entry_time,
+                  rate_at_entry(ParkingRate.rate_per_hour), rate_at_entry(ParkingRate.rate_per_day)) \
+        .outerjoin(History, (History.car_id == Car.id) & History.exit_time.is_(None)) \
+        .where(Car.plate == plate).order_by(History.entry_time).limit(1)
+    car_row = (await session.execute(stmt)).one_or_none()
+
+    image_id = await insert_image(session, plate, url, cloudinary_public_id, upload_status)
+
+    if car_row is None:
+        stmt = insert(History).values(exit_time=exit_time, image_id=image_id).returning(*History.__table__.c)
+        history = (await session.execute(stmt)).one()
+        await session.commit()
+        return image_id, history
+
+    car_id, credit, history_id, entry_time, rate_per_hour, rate_per_day = car_row
+    if history_id is None:
+        await session.commit()
+        return image_id, None
+
+    if rate_per_hour is None:
+        rate_per_hour = ParkingRate.rate_per_hour.default.arg
+        rate_per_day = ParkingRate.rate_per_day.default.arg
+
+    duration_hours = await calculate_parking_duration(entry_time, exit_time)
+    if duration_hours > 24:
+        cost = await calculate_parking_cost(duration_hours, rate_per_day)
+    else:
+        cost = await calculate_parking_cost(duration_hours, rate_per_hour)
+
+    # The session is closed only if it is still open: when the exit camera fires twice, the event that read
+    # the open session too early changes nothing, and the car is not charged and counted out twice
+    closed = (await session.execute(
+        update(History).where(History.id == history_id).where(History.exit_time.is_(None))
+        .values(exit_time=exit_time, rate_id=rate_id, parking_time=duration_hours, cost=cost)
+        .returning(History.id)
+    )).scalar_one_or_none()
+    if closed is None:
+        await session.commit()
+        return image_id, None
+
+    occupied = await change_occupancy(session, -1)
+    number_free_spaces = count_free_spaces(number_of_spaces, occupied + 1) + 1
+
+    # The credit is decremented in the database, so concurrent exits of cars sharing it are not lost
+    credit = (await session.execute(
+        update(Car).where(Car.id == car_id).values(credit=Car.credit - cost).returning(Car.credit)
+    )).scalar_one()
+
+    stmt = update(History).where(History.id == history_id).values(
+        number_free_spaces=number_free_spaces,
+        paid=True if credit is not None and credit >= 0 else History.paid
+    ).returning(*History.__table__.c)
+    history = (await session.execute(stmt)).one()
+
+    await session.commit()
+    return image_id, history
@@ -1,10 +1,17 @@
 import csv
+import io
+import zlib
 from datetime import datetime, time, timedelta
-from typing import Sequence, Tuple
-from sqlalchemy import and_, desc, func, null, or_, select
+from typing import AsyncIterator, Sequence, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import RowMapping, and_, desc, func, null, select
 from sqlalchemy.ext.asyncio import AsyncSession
-from src.entity.models import Car, History, ParkingRate, User
+from sqlalchemy.orm import contains_eager
+from src.database.db import sessionmanager
+from src.entity.models import Car, History, Image, ParkingRate, User
 from src.repository.car import CarRepository
+from src.repository.occupancy import change_occupancy, get_occupancy
+from src.schemas.history import HistoryUpdate
 from src.services.email_sender import send_email
 
 #Implementing entry time recording every time a license plate is detected
@@ -17,6 +24,7 @@ async def create_entry(find_plate: str, image_id: int, session: AsyncSession) ->
     car_repository = CarRepository(session)
     car_row = await car_repository.get_car_by_plate(find_plate)
     image_id = int(image_id)
+    await change_occupancy(session, 1)
     if car_row:
         car_id = car_row.id
     else:
@@ -39,7 +47,6 @@ async def create_entry(find_plate: str, image_id: int, session: AsyncSession) ->
 
 #Implementing exit time recording every time a license plate is detected
 async def create_exit(find_plate: str, image_id: int, session: AsyncSession):
-    history_entries = await get_history_entries_with_null_exit_time(session)
     number_free_spaces, rate_id = await update_parking_spaces(session)
     number_free_spaces += 1
     rate_id=int(rate_id)
@@ -49,37 +56,37 @@ async def create_exit(find_plate: str, image_id: int, session: AsyncSession):
     car_repository = CarRepository(session)
     car_row = await car_repository.get_car_by_plate(find_plate)
     if car_row:
-        for history in history_entries:
-            if history.car_id == car_row.id:
+        history = await get_open_history(car_row.id, session)
+        if history is not None:
+            await change_occupancy(session, -1)
+            history.exit_time = exit_time
+            history.number_free_spaces = number_free_spaces
+            history.rate_id = rate_id
 
-                history.exit_time = exit_time
-                history.number_free_spaces = number_free_spaces
-                history.rate_id = rate_id
+            #to the calculation of the cost of parking (using parking rate values)(class ParkingRate from the module category)
+            rate_per_hour, rate_per_day = await get_parking_rates_for_date(history.entry_time, session)
 
-                #to the calculation of the cost of parking (using parking rate values)(class ParkingRate from the module category)
-                rate_per_hour, rate_per_day = await get_parking_rates_for_date(history.entry_time, session)
+            #Implementing parking duration tracking
+            duration_hours = await calculate_parking_duration(history.entry_time, history.exit_time)
 
-                #Implementing parking duration tracking
-                duration_hours = await calculate_parking_duration(history.entry_time, history.exit_time)
+            #the calculation of the cost of parking
+            if duration_hours > 24:
+                cost = await calculate_parking_cost(duration_hours, rate_per_day)
+            else:
+                cost = await calculate_parking_cost(duration_hours, rate_per_hour)
 
-                #the calculation of the cost of parking
-                if duration_hours > 24:
-                    cost = await calculate_parking_cost(duration_hours, rate_per_day)
-                else:
-                    cost = await calculate_parking_cost(duration_hours, rate_per_hour)
+            history.parking_time = duration_hours  #duration of parking
+            history.cost = cost #the calculation of the cost of parking
 
-                history.parking_time = duration_hours  #duration of parking
-                history.cost = cost #the calculation of the cost of parking
+            car_row.credit -= cost #the calculation of the cost of parking
+            session.add(car_row)
 
-                car_row.credit -= cost #the calculation of the cost of parking
-                session.add(car_row)
+            if car_row.credit >= 0:
+                history.paid = True #the calculation of the cost of parking
 
-                if car_row.credit >= 0:
-                    history.paid = True #the calculation of the cost of parking
-
-                await session.commit()
-                await session.refresh(history)
-                return history
+            await session.commit()
+            await session.refresh(history)
+            return history
     else:
         history_new = History(
             exit_time=exit_time, image_id=image_id, ###number_free_spaces=number_free_spaces,rate_id=rate_id
@@ -116,10 +123,16 @@ async def get_parking_rates_for_date(entry_time: datetime, session: AsyncSession
         default_rate_per_day = ParkingRate.rate_per_day.default.arg
         return default_rate_per_hour, default_rate_per_day
 
+#Finding the open parking session of a car (uses the partial index ix_history_open_car_id)
+async def get_open_history(car_id: int, session: AsyncSession) -> History | None:
+    stmt = select(History).where(History.car_id == car_id, History.exit_time.is_(None)) \
+        .order_by(History.entry_time).limit(1)
+    result = await session.execute(stmt)
+    return result.unique().scalars().first()
+
 async def get_history_entries_with_null_exit_time(session: AsyncSession) -> Sequence[History]:
 
-    stmt = select(History).filter(
-        or_(History.exit_time.is_(None), History.exit_time == func.now()))
+    stmt = select(History).filter(History.exit_time.is_(None))
     result = await session.execute(stmt)
     history_entries = result.unique().scalars().all()
     return history_entries
@@ -127,8 +140,10 @@ async def get_history_entries_with_null_exit_time(session: AsyncSession) -> Sequ
 
 #Getting and adding information about paid parking
 async def update_paid_history( plate: str,  paid: bool, session: AsyncSession):
+    # An IN subquery instead of History.car.has, so the car is found by its plate and then its unpaid
+    # sessions by the partial index ix_history_unpaid_car_id
     statement = select(History).where(
-        and_(History.car.has(plate=plate), History.paid == False)
+        and_(History.car_id.in_(select(Car.id).where(Car.plate == plate)), History.paid == False)
     )
     result = await session.execute(statement)
     history_entry = result.unique().scalars().first()
@@ -142,12 +157,37 @@ async def update_paid_history( plate: str,  paid: bool, session: AsyncSession):
     await session.refresh(history_entry)
     return history_entry
 
-#Getting information about unpaid parking
-async def get_history_entries_with_null_paid(session: AsyncSession) -> Sequence[History]:
-    query = select(History).filter(History.paid == False)
+
+#Columns of the history lists, the fields of HistoryUpdate
+HISTORY_LIST_COLUMNS = {name: getattr(History, name) for name in HistoryUpdate.model_fields}
+
+
+async def list_history_entries(session: AsyncSession, condition, after_id: int | None = None,
+                               limit: int | None = None, fields: Sequence[str] | None = None) -> Sequence[RowMapping]:
+    """
+    The list_history_entries function reads a page of the History rows matching a condition.
+    The rows are read in id order after the given id (keyset pagination), only the requested columns are selected.
+
+    :param session: AsyncSession: The database session
+    :param condition: The filter of the list, e.g. History.paid == False
+    :param after_id: int | None: Id of the last row of the previous page
+    :param limit: int | None: Maximum number of rows, all rows if None
+    :param fields: Sequence[str] | None: Names of HISTORY_LIST_COLUMNS to select, all if None
+    :return: The rows as mappings, always with the id
+    """
+    columns = [History.id] + [HISTORY_LIST_COLUMNS[name] for name in fields or HISTORY_LIST_COLUMNS if name != "id"]
+    query = select(*columns).where(condition)
+    if after_id is not None:
+        query = query.where(History.id > after_id)
+    query = query.order_by(History.id).limit(limit)
     result = await session.execute(query)
-    history_entries = result.unique().scalars().all()
-    return history_entries
+    return result.mappings().all()
+
+
+#Getting information about unpaid parking
+async def get_history_entries_with_null_paid(session: AsyncSession, after_id: int | None = None,
+                                             limit: int | None = None, fields: Sequence[str] | None = None):
+    return await list_history_entries(session, History.paid == False, after_id, limit, fields)
 
 
 ###Additional functionality for getting different information
@@ -158,7 +198,7 @@ async def get_history_entries_by_period(start_time: datetime, end_time: datetime
 
     query = select(History).join(Car).filter(
         History.entry_time.between(start_time, end_time)
-    )
+    ).options(contains_eager(History.car))  # the plate is written to the CSV report
     result = await session.execute(query)
     history_entries = result.unique().scalars().all()
     return history_entries 
@@ -171,20 +211,17 @@ async def get_history_entries_by_period_car (start_time: datetime, end_time: dat
     query = select(History).join(Car).filter(
         History.entry_time.between(start_time, end_time),
         History.car_id == car_id
-    )
+    ).options(contains_eager(History.car))  # the plate is written to the CSV report
     result = await session.execute(query)
     history_entries = result.unique().scalars().all()
     return history_entries
 
-async def get_history_entries_with_null_car_id(session: AsyncSession) -> Sequence[History]:
-    query = select(History).filter(History.car_id == null())
-    result = await session.execute(query)
-    history_entries = result.unique().scalars().all()
-    return history_entries
+async def get_history_entries_with_null_car_id(session: AsyncSession, after_id: int | None = None,
+                                               limit: int | None = None, fields: Sequence[str] | None = None):
+    return await list_history_entries(session, History.car_id == null(), after_id, limit, fields)
 
 async def update_parking_spaces(session: AsyncSession) -> Tuple[int, int]:
-    history_entries = await get_history_entries_with_null_exit_time(session)
-    num_entries = len(history_entries)
+    num_entries = await get_occupancy(session)
 
     latest_parking_rate = await get_latest_parking_rate(session)
     latest_parking_rate_spaces = latest_parking_rate.number_of_spaces if latest_parking_rate else 0
@@ -212,8 +249,10 @@ async def get_latest_parking_rate_with_free_spaces(session: AsyncSession):
     return "No data available"
 
 async def update_car_history( plate: str, car_id: int, session: AsyncSession):
+    # The images of the plate are found by ix_images_current_plate, History.image.has would check
+    # the image of every history row without a car
     statement = select(History).where(
-        and_(History.image.has(current_plate=plate), History.car_id == null())
+        and_(History.image_id.in_(select(Image.id).where(Image.current_plate == plate)), History.car_id == null())
     )
     result = await session.execute(statement)
     history_entry = result.unique().scalars().first()
@@ -235,32 +274,145 @@ def format_timedelta(td):
     minutes = remainder // 60
     return f"{days}d {hours}h {minutes}m"
 
-async def save_history_to_csv(history_entries: Sequence[History], file_path: str):
-    fieldnames = [
-        'entry_time',
-        'exit_time',
-        'parking_time',
-        'cost',
-        'paid',
-        'number_free_spaces',
-        'plate'
-    ]
+HISTORY_CSV_FIELDS = ['entry_time', 'exit_time', 'parking_time', 'cost', 'paid', 'number_free_spaces', 'plate']
+
+HISTORY_EXPORT_COLUMNS = (History.entry_time, History.exit_time, History.parking_time, History.cost, History.paid,
+                          History.number_free_spaces, Car.plate)
+
 
+def format_history_row(entry_time, exit_time, parking_time, cost, paid, number_free_spaces, plate) -> dict:
+    parking_duration = timedelta(hours=parking_time) if parking_time is not None else None
+    return {
+        'entry_time': entry_time.strftime('%Y-%m-%d %H:%M') if entry_time else None,
+        'exit_time': exit_time.strftime('%Y-%m-%d %H:%M') if exit_time else None,
+        'parking_time': format_timedelta(parking_duration) if parking_duration else None,
+        'cost': f"{cost:.2f}" if cost is not None else None,
+        'paid': paid,
+        'number_free_spaces': number_free_spaces,
+        'plate': plate
+    }
+
+async def save_history_to_csv(history_entries: Sequence[History], file_path: str):
     with open(file_path, mode='w', newline='') as file:
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
+        writer = csv.DictWriter(file, fieldnames=HISTORY_CSV_FIELDS)
         writer.writeheader()
         for entry in history_entries:
-            parking_duration = timedelta(hours=entry.parking_time) if entry.parking_time is not None else None
-            entry_dict = {
-                'entry_time': entry.entry_time.strftime('%Y-%m-%d %H:%M') if entry.entry_time else None,
-                'exit_time': entry.exit_time.strftime('%Y-%m-%d %H:%M') if entry.exit_time else None,
-                'parking_time': format_timedelta(parking_duration) if parking_duration else None,
-                'cost': f"{entry.cost:.2f}" if entry.cost is not None else None,
-                'paid': entry.paid,
-                'number_free_spaces': entry.number_free_spaces,
-                'plate': entry.car.plate
-            }
-            writer.writerow(entry_dict)
+            writer.writerow(format_history_row(entry.entry_time, entry.exit_time, entry.parking_time, entry.cost,
+                                               entry.paid, entry.number_free_spaces, entry.car.plate))
+
+#Streaming the history of a period in batches, for exports of any length
+async def stream_history_by_period(start_time: datetime, end_time: datetime, car_id: int | None = None,
+                                   batch_size: int = 1000) -> AsyncIterator[Sequence]:
+    start_time = datetime.combine(start_time.date(), time.min)
+    end_time = datetime.combine(end_time.date(), time.max)
+
+    query = select(*HISTORY_EXPORT_COLUMNS).join(Car).filter(History.entry_time.between(start_time, end_time))
+    if car_id is not None:
+        query = query.filter(History.car_id == car_id)
+    query = query.order_by(History.entry_time).execution_options(yield_per=batch_size)
+
+    # The export is streamed after the request handler returns, so it uses its own session
+    # (of the read replica if there is one) and a server-side cursor instead of the request session
+    async with sessionmanager.read_session() as session:
+        result = await session.stream(query)
+        async for rows in result.partitions():
+            yield rows
+
+async def history_csv_chunks(batches: AsyncIterator[Sequence], compress: bool = False) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=HISTORY_CSV_FIELDS)
+    compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31 writes a gzip container
+
+    def take_chunk() -> bytes:
+        chunk = buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(chunk) if compressor else chunk
+
+    writer.writeheader()
+    async for rows in batches:
+        for row in rows:
+            writer.writerow(format_history_row(*row))
+        yield take_chunk()
+
+    chunk = take_chunk()
+    if compressor:
+        chunk += compressor.flush()
+    yield chunk
+
+
+#Columnar exports (Parquet, Arrow IPC) with native column types, pyarrow is only needed for them
+EXPORT_MEDIA_TYPES = {'parquet': 'application/vnd.apache.parquet', 'arrow': 'application/vnd.apache.arrow.stream'}
+
+def import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED,
+                            detail="Parquet and Arrow exports require pyarrow to be installed")
+    return pyarrow
+
+class ChunkSink:
+    """File-like object that collects what a pyarrow writer writes, so it can be streamed in chunks."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        chunk = b"".join(self.chunks)
+        self.chunks.clear()
+        return chunk
+
+def history_columnar_chunks(batches: AsyncIterator[Sequence], file_format: str) -> AsyncIterator[bytes]:
+    # pyarrow is imported before the response starts, so a missing pyarrow is reported as 501
+    pa = import_pyarrow()
+    schema = pa.schema([
+        ('entry_time', pa.timestamp('us')),
+        ('exit_time', pa.timestamp('us')),
+        ('parking_time', pa.float64()),
+        ('cost', pa.float64()),
+        ('paid', pa.bool_()),
+        ('number_free_spaces', pa.int32()),
+        ('plate', pa.string()),
+    ])
+
+    async def chunks():
+        sink = ChunkSink()
+        if file_format == 'parquet':
+            writer = pa.parquet.ParquetWriter(sink, schema, compression='zstd')
+        else:
+            writer = pa.ipc.new_stream(sink, schema)
+
+        async for rows in batches:
+            columns = zip(*rows)
+            table = pa.Table.from_arrays([pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                                         schema=schema)
+            writer.write_table(table)  # one Parquet row group / Arrow record batch per batch of rows
+            yield sink.take()
+
+        writer.close()
+        yield sink.take()
+
+    return chunks()
 
 
 ### Limits of parking expenses with notification
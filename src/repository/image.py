@@ -1,10 +1,10 @@
 import random
 from typing import Tuple
 
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.entity.models import Image
+from src.entity.models import Image, UploadStatus
 
 
 async def get_random_image_info(session: AsyncSession) -> Tuple[str, int]:
@@ -15,9 +15,24 @@ async def get_random_image_info(session: AsyncSession) -> Tuple[str, int]:
     return random_image.current_plate, random_image.id
 
 
-async def create_image(session: AsyncSession, current_plate: str, url: str, cloudinary_public_id: str) -> Image:
-    image = Image(current_plate=current_plate, url=url, cloudinary_public_id=cloudinary_public_id)
+async def create_image(session: AsyncSession, current_plate: str, url: str, cloudinary_public_id: str,
+                       upload_status: UploadStatus = UploadStatus.uploaded) -> Image:
+    image = Image(current_plate=current_plate, url=url, cloudinary_public_id=cloudinary_public_id,
+                  upload_status=upload_status)
     session.add(image)
     await session.commit()
     await session.refresh(image)
     return image
+
+
+async def update_image_url(session: AsyncSession, image_id: int, url: str, cloudinary_public_id: str) -> None:
+    stmt = update(Image).where(Image.id == image_id).values(url=url, cloudinary_public_id=cloudinary_public_id,
+                                                            upload_status=UploadStatus.uploaded)
+    await session.execute(stmt)
+    await session.commit()
+
+
+async def set_image_upload_status(session: AsyncSession, image_id: int, upload_status: UploadStatus) -> None:
+    stmt = update(Image).where(Image.id == image_id).values(upload_status=upload_status)
+    await session.execute(stmt)
+    await session.commit()
@@ -0,0 +1,75 @@
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.entity.models import History, Occupancy
+
+LOT_ID = 1
+
+
+async def count_open_sessions(session: AsyncSession) -> int:
+    """
+    The count_open_sessions function counts the parked cars from the History rows without exit time.
+    It is the source of truth the occupancy counter is reconciled with.
+
+    :param session: AsyncSession: The database session
+    :return: The number of open parking sessions
+    """
+    result = await session.execute(select(func.count(History.id)).where(History.exit_time.is_(None)))
+    return result.scalar_one()
+
+
+async def reconcile_occupancy(session: AsyncSession, pending: int = 0) -> int:
+    """
+    The reconcile_occupancy function sets the occupancy counter to the number of open parking sessions,
+    creating the counter row if it does not exist. The caller commits the session.
+
+    The counter row is created if missing, ignoring the conflict with a concurrent request that creates it
+    too, and locked before the sessions are counted, so gate events in flight are either committed
+    and counted or wait until the reconciliation commits; a stale count never overwrites them.
+
+    :param session: AsyncSession: The database session
+    :param pending: int: Change of a gate event whose History row is not written yet
+    :return: The number of parked cars
+    """
+    dialect = postgresql if session.bind.dialect.name == "postgresql" else sqlite
+    await session.execute(dialect.insert(Occupancy).values(id=LOT_ID, occupied=0)
+                          .on_conflict_do_nothing(index_elements=[Occupancy.id]))
+    await session.execute(select(Occupancy.id).where(Occupancy.id == LOT_ID).with_for_update())
+
+    open_sessions = select(func.count(History.id)).where(History.exit_time.is_(None)).scalar_subquery()
+    stmt = update(Occupancy).where(Occupancy.id == LOT_ID) \
+        .values(occupied=open_sessions + pending).returning(Occupancy.occupied)
+    return (await session.execute(stmt)).scalar_one()
+
+
+async def change_occupancy(session: AsyncSession, delta: int) -> int:
+    """
+    The change_occupancy function atomically adds delta to the occupancy counter. The counter row stays
+    locked until the gate event transaction ends, so concurrent gates never lose an update.
+    It is called before the History row of the gate event is written.
+
+    :param session: AsyncSession: The session of the gate event transaction
+    :param delta: int: 1 for an entry, -1 for an exit that closes a parking session
+    :return: The number of parked cars after the change
+    """
+    stmt = update(Occupancy).where(Occupancy.id == LOT_ID) \
+        .values(occupied=Occupancy.occupied + delta).returning(Occupancy.occupied)
+    occupied = (await session.execute(stmt)).scalar_one_or_none()
+    if occupied is None:
+        occupied = await reconcile_occupancy(session, delta)
+    return occupied
+
+
+async def get_occupancy(session: AsyncSession) -> int:
+    """
+    The get_occupancy function reads the number of parked cars from the occupancy counter,
+    falling back to counting the open parking sessions if the counter row does not exist.
+
+    :param session: AsyncSession: The database session
+    :return: The number of parked cars
+    """
+    occupied = (await session.execute(select(Occupancy.occupied).where(Occupancy.id == LOT_ID))).scalar_one_or_none()
+    if occupied is None:
+        occupied = await count_open_sessions(session)
+    return occupied
@@ -8,6 +8,7 @@ from src.database.db import get_db
 from src.entity.models import User, Role
 from src.schemas.user import UserModel, UserUpdate
 from src.services import auth
+from src.services.auth_cache import auth_cache
 from src.static.telebot_tokens import tokens
 
 
@@ -84,8 +85,10 @@ async def update_token(user: User, token: str | None, db: AsyncSession):
     :param db: AsyncSession: Pass the database session to the function
     :return: The user object
     """
+    email = user.email  # the user is expired by the commit
     user.refresh_token = token
     await db.commit()
+    auth_cache.invalidate_user(email)
 
 
 async def update_user(email: str, user_update: UserUpdate, db: AsyncSession):
@@ -109,12 +112,13 @@ async def update_user(email: str, user_update: UserUpdate, db: AsyncSession):
         for field, value in user_update.__dict__.items():
             if value is not None:
                 if field == 'password':
-                    setattr(user, field, auth.auth_service.get_password_hash(value))
+                    setattr(user, field, await auth.auth_service.get_password_hash(value))
                 else:
                     setattr(user, field, value)
 
         await db.commit()
         await db.refresh(user)
+        auth_cache.invalidate_user(email)
         return user
     else:
         return None
@@ -137,6 +141,7 @@ async def ban_user(username: str, db: AsyncSession):
     if user:
         user.ban = True
         await db.commit()
+        auth_cache.invalidate_user(username)
         return True
     else:
         return False
@@ -1,15 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.db import get_db
+from src.database.db import get_db, get_read_db
 from src.entity.models import User, Role
-from src.repository.car import CarRepository
+from src.repository.car import CAR_LIST_FIELDS, CarRepository
+from src.repository.occupancy import reconcile_occupancy
 from src.repository.parking import create_rate, create_or_update_rate, get_default_rate_values
 from src.schemas.user import UserResponse
 from src.schemas.car import CarModel, CarUpdate, NewCarResponse
 from src.schemas.parking import ParkingRateSchema, NewParkingRateSchema
 from src.services.auth import auth_service
+from src.services.pagination import Pagination
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
@@ -45,15 +47,16 @@ async def create_or_update_parking_rate(rate_data: NewParkingRateSchema, db: Asy
 
 
 @router.get("/cars/parked", response_model=list[NewCarResponse], status_code=status.HTTP_200_OK)
-async def read_parked_cars(db: AsyncSession = Depends(get_db),
+async def read_parked_cars(response: Response, page: Pagination = Depends(), db: AsyncSession = Depends(get_read_db),
                            admin: User = Depends(auth_service.get_current_admin)):
     if admin.role != Role.admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied. You don't have enough rights")
     car_repository = CarRepository(db)
-    parked_cars = await car_repository.get_cars_currently_parked()
-    if not parked_cars:
+    fields = page.field_names(CAR_LIST_FIELDS)
+    parked_cars = await car_repository.get_cars_currently_parked(page.after_id, page.fetch_limit, fields)
+    if not parked_cars and page.after_id is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No cars currently parked")
-    return parked_cars
+    return page.response(response, parked_cars)
 
 
 @router.get("/cars/{plate}", response_model=NewCarResponse, status_code=status.HTTP_200_OK)
@@ -69,15 +72,14 @@ async def read_car(plate: str, db: AsyncSession = Depends(get_db),
 
 
 @router.get("/cars", response_model=list[NewCarResponse], status_code=status.HTTP_200_OK)
-async def read_cars(db: AsyncSession = Depends(get_db),
+async def read_cars(response: Response, page: Pagination = Depends(), db: AsyncSession = Depends(get_read_db),
                     admin: User = Depends(auth_service.get_current_admin)):
     if admin.role != Role.admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied. You don't have enough rights")
     car_repository = CarRepository(db)
-    cars = await car_repository.get_all_cars()
-    if cars is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No cars found")
-    return cars
+    fields = page.field_names(CAR_LIST_FIELDS)
+    cars = await car_repository.get_all_cars(page.after_id, page.fetch_limit, fields)
+    return page.response(response, cars)
 
 
 @router.get("/users-by-car/{plate}", response_model=list[UserResponse], status_code=status.HTTP_200_OK)
@@ -128,3 +130,13 @@ async def delete_car(plate: str, db: AsyncSession = Depends(get_db),
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Car not found")
     await car_repository.delete_car(plate)
     return JSONResponse(status_code=status.HTTP_200_OK, content={"message": f"Car {plate} has been deleted"})
+
+
+@router.post("/occupancy/reconcile", response_model=dict, status_code=status.HTTP_200_OK)
+async def reconcile_occupancy_counter(db: AsyncSession = Depends(get_db),
+                                      admin: User = Depends(auth_service.get_current_admin)):
+    if admin.role != Role.admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied. You don't have enough rights")
+    occupied = await reconcile_occupancy(db)
+    await db.commit()
+    return {"occupied": occupied}
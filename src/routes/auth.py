@@ -41,7 +41,7 @@ async def signup(body: UserModel, db: AsyncSession = Depends(get_db)):
     exist_user = await repositories_users.get_user_by_email(body.email, db)
     if exist_user:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Account already exists")
-    body.password = auth_service.get_password_hash(body.password)
+    body.password = await auth_service.get_password_hash(body.password)
     
     telegram_token = None
     is_first_user = await repositories_users.check_is_first_user(db)
@@ -69,10 +69,14 @@ async def login(request: Request, body: OAuth2PasswordRequestForm = Depends(), d
     user = await repositories_users.get_user_by_email(body.username, db)
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email")
-    if not auth_service.verify_password(body.password, user.password):
+    verified, new_password_hash = await auth_service.verify_and_update_password(body.password, user.password)
+    if not verified:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password")
     if user.ban:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You were banned by an administrator")
+    if new_password_hash:
+        # The hashing settings changed since the password was set, the new hash is saved with the refresh token
+        user.password = new_password_hash
     
     
     TOKEN = user.telegram_token
@@ -1,25 +1,44 @@
-import os
 from fastapi import APIRouter
 
 from typing import List
 from datetime import datetime, timedelta
-from fastapi.responses import FileResponse
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.db import get_db
+from src.database.db import get_db, get_read_db
 from src.repository import history as repositories_history
 from src.schemas.history import HistoryUpdatePaid, HistoryGet, HistoryUpdateCar, HistoryUpdate, \
     HistorySchema
 from src.entity.models import User, Role
 from src.services.auth import auth_service
+from src.services.pagination import Pagination
 from src.repository.car import CarRepository
 
 
-current_dir = os.getcwd()
 router = APIRouter(prefix="/history", tags=["History"])
 
 
+def history_export_response(batches, file_name: str, file_format: str, gzip: bool) -> StreamingResponse:
+    """
+    The history_export_response function streams history rows as a file download.
+
+    :param batches: The batches of rows from repositories_history.stream_history_by_period
+    :param file_name: str: Name of the downloaded file without extension
+    :param file_format: str: "csv", "parquet" or "arrow"
+    :param gzip: bool: Compress the CSV with gzip, Parquet is always compressed
+    :return: A StreamingResponse
+    """
+    if file_format in repositories_history.EXPORT_MEDIA_TYPES:
+        content = repositories_history.history_columnar_chunks(batches, file_format)
+        file_name, media_type = f"{file_name}.{file_format}", repositories_history.EXPORT_MEDIA_TYPES[file_format]
+    else:
+        content = repositories_history.history_csv_chunks(batches, gzip)
+        file_name, media_type = (f"{file_name}.csv.gz", "application/gzip") if gzip else (f"{file_name}.csv", "text/csv")
+    return StreamingResponse(content, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{file_name}"'})
+
+
 @router.get("/create_entry/{find_plate}/{image_id}", response_model=HistoryUpdate)
 async def create_entry(find_plate, image_id, session: AsyncSession = Depends(get_db)):
     history = await repositories_history.create_entry(find_plate, image_id, session)
@@ -51,15 +70,21 @@ async def update_paid(plate: str, history_update: HistoryUpdatePaid,
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/get_no_paid", response_model=List[HistoryUpdate])
-async def get_history_entries_with_null_paid(session: AsyncSession = Depends(get_db)):
-    history_entries = await repositories_history.get_history_entries_with_null_paid(session)
-    return history_entries
+async def get_history_entries_with_null_paid(response: Response, page: Pagination = Depends(),
+                                             session: AsyncSession = Depends(get_read_db)):
+    fields = page.field_names(repositories_history.HISTORY_LIST_COLUMNS)
+    history_entries = await repositories_history.get_history_entries_with_null_paid(session, page.after_id,
+                                                                                    page.fetch_limit, fields)
+    return page.response(response, history_entries)
 
 ###Additional functionality for getting different information
 @router.get("/get_null_car_id", response_model=List[HistoryUpdate])
-async def get_history_entries_with_null_car_id_route(session: AsyncSession = Depends(get_db)):
-    history_entries = await repositories_history.get_history_entries_with_null_car_id(session)
-    return history_entries
+async def get_history_entries_with_null_car_id_route(response: Response, page: Pagination = Depends(),
+                                                     session: AsyncSession = Depends(get_read_db)):
+    fields = page.field_names(repositories_history.HISTORY_LIST_COLUMNS)
+    history_entries = await repositories_history.get_history_entries_with_null_car_id(session, page.after_id,
+                                                                                      page.fetch_limit, fields)
+    return page.response(response, history_entries)
 
 
 @router.patch("/update_car_in_history/{plate}", response_model=HistoryUpdateCar)
@@ -81,7 +106,8 @@ async def update_car_history(plate: str, history_update: HistoryUpdateCar,
 async def get_history_entries_by_period_route(
         start_date: str,
         end_date: str,
-        session: AsyncSession = Depends(get_db),
+        file_format: str = Query("csv", alias="format", pattern="^(csv|parquet|arrow)$"),
+        gzip: bool = Query(False),
         admin: User = Depends(auth_service.get_current_admin),
 ):
     if admin.role != Role.admin:
@@ -95,19 +121,18 @@ async def get_history_entries_by_period_route(
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date format. Please use YYYY-MM-DD")
 
-    history_entries = await repositories_history.get_history_entries_by_period(start_datetime, end_datetime, session)
-    file_path = os.path.join(current_dir, '../ParkSense-AI/history_entries.csv')
-    await repositories_history.save_history_to_csv(history_entries, file_path)
-    # return history_entries
-    return FileResponse(file_path, filename="history_entries.csv", media_type="text/csv")
+    batches = repositories_history.stream_history_by_period(start_datetime, end_datetime)
+    return history_export_response(batches, f"history_entries_{start_date}_{end_date}", file_format, gzip)
 
 
 @router.get("/get_entries_by_period/{start_date}/{end_date}/{car_id}")
 
 async def get_history_entries_for_car_by_period_route(
         start_date: str, end_date: str, car_id: int,
+        file_format: str = Query("csv", alias="format", pattern="^(csv|parquet|arrow)$"),
+        gzip: bool = Query(False),
         current_user: User = Depends(auth_service.get_current_user),
-        session: AsyncSession = Depends(get_db),
+        session: AsyncSession = Depends(get_read_db),
 ):
     car_repository = CarRepository(session)
     user_id = await car_repository.get_user_id_by_car_id(car_id)
@@ -124,10 +149,6 @@ async def get_history_entries_for_car_by_period_route(
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date format. Please use YYYY-MM-DD")
 
-    history_entries = await repositories_history.get_history_entries_by_period_car(start_datetime, end_datetime, car_id,
-                                                                                   session)
-
-    file_path = os.path.join(current_dir, '../ParkSense-AI/history_entries.csv')
-    await repositories_history.save_history_to_csv(history_entries, file_path)
-    return FileResponse(file_path, filename="history_entries.csv", media_type="text/csv")
+    batches = repositories_history.stream_history_by_period(start_datetime, end_datetime, car_id)
+    return history_export_response(batches, f"history_entries_{car_id}_{start_date}_{end_date}", file_format, gzip)
 
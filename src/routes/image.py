@@ -1,40 +1,81 @@
 import logging
+from datetime import datetime
 
-import asynctempfile
-from fastapi import APIRouter, File, UploadFile, Form, HTTPException, Depends, status
+from fastapi import APIRouter, File, UploadFile, Form, HTTPException, Depends, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from DS.functions.image_process import plate_recognize
-from src.database.db import get_db
-from src.entity.models import User
-from src.repository.history import create_entry, create_exit
-from src.repository.image import create_image
+from src.conf.config import config
+from src.database.db import get_db, sessionmanager
+from src.entity.models import UploadStatus, User
+from src.repository.gate import record_entry, record_exit
+from src.repository.image import set_image_upload_status
 from src.services.auth import auth_service
-from src.services.cloud_service import cloud_service
+from src.services.metrics import StageTimer, gate_stage_seconds
+from src.services.recognition import recognition_service
+from src.services.storage import storage
+from src.services.upload_queue import upload_queue
 
 router = APIRouter(prefix="/parking", tags=["Parking"])
 
 
-@router.post("/entry")
-async def park_entry(user: User = Depends(auth_service.get_current_user), photo: UploadFile = File(...),
-                     plate_number: str = Form(None), session: AsyncSession = Depends(get_db)) -> dict:
-    # try:
-
-    async with asynctempfile.NamedTemporaryFile(delete=False) as temp_file:
-        await temp_file.write(await photo.read())
-        file_path = temp_file.name
+async def spool_image(image_id: int, photo: bytes, plate_rect: list, text: str, folder: str) -> None:
+    """
+    The spool_image function writes a gate photo to the upload spool before the response is sent.
+    The upload queue annotates it, uploads it and stores the url in the Image row that was created as pending.
 
-    img_processed, recognized_symbols = await plate_recognize(file_path)
+    :param image_id: int: Id of the Image row of the gate event
+    :param photo: bytes: The original photo of the car
+    :param plate_rect: list: The boxes of the detected plates
+    :param text: str: The date and time of the gate event, drawn on the image
+    :param folder: str: The storage folder, Entry_photos or Exit_photos
+    :return: None
+    """
+    try:
+        await upload_queue.enqueue_photo(image_id, photo, plate_rect, text, folder)
+    except Exception as err:
+        logging.error(f"Could not spool image {image_id}: {err}")
+        async with sessionmanager.session() as session:
+            await set_image_upload_status(session, image_id, UploadStatus.failed)
 
-    if not recognized_symbols and not plate_number:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
-                            detail="License plate not recognized and not entered manually")
 
-    img_url, cloudinary_public_id = await cloud_service.upload_image(img_processed, 'Entry_photos')
-    logging.info(img_url)
-
-    picture = await create_image(session, recognized_symbols or plate_number, img_url, cloudinary_public_id)
-    history = await create_entry(recognized_symbols or plate_number, picture.id, session)  # Виклик функції create_entry
+@router.post("/entry")
+async def park_entry(response: Response, user: User = Depends(auth_service.get_current_user),
+                     photo: UploadFile = File(...), plate_number: str = Form(None),
+                     camera_id: str = Form(None), session: AsyncSession = Depends(get_db)) -> dict:
+    # try:
+    timer = StageTimer()
+    try:
+        with timer.stage("read"):
+            photo_bytes = await photo.read()
+        with timer.stage("recognition"):
+            img_processed, recognized_symbols, plate_rect = await recognition_service.recognize(
+                photo_bytes, timer.timings, camera_id, annotate=not config.DEFER_IMAGE_UPLOAD)
+
+        if not recognized_symbols and not plate_number:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail="License plate not recognized and not entered manually")
+
+        if config.DEFER_IMAGE_UPLOAD:
+            img_url, cloudinary_public_id = None, ""
+        else:
+            with timer.stage("upload"):
+                img_url, cloudinary_public_id = await storage.upload_image(img_processed, 'Entry_photos')
+        logging.info(img_url)
+
+        with timer.stage("db"):
+            image_id, history = await record_entry(session, recognized_symbols or plate_number, img_url or "",
+                                                   cloudinary_public_id,
+                                                   UploadStatus.pending if img_url is None else UploadStatus.uploaded)
+
+        if config.DEFER_IMAGE_UPLOAD:
+            with timer.stage("spool"):
+                await spool_image(image_id, photo_bytes, plate_rect, datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                                  'Entry_photos')
+    finally:
+        timer.observe(gate_stage_seconds, endpoint="entry")
+
+    if config.SERVER_TIMING:
+        response.headers["Server-Timing"] = timer.server_timing()
     return {"message": "Welcome to Cars Home!", "image_url": img_url,
             "plate_number": recognized_symbols or plate_number}
     # #TODO create scheme
@@ -44,27 +85,46 @@ async def park_entry(user: User = Depends(auth_service.get_current_user), photo:
 
 @router.post("/exit")
 async def park_exit(
+        response: Response,
         user: User = Depends(auth_service.get_current_user),
         photo: UploadFile = File(...),
         plate_number: str = Form(None),
+        camera_id: str = Form(None),
         session: AsyncSession = Depends(get_db)
 ) -> dict:
     # try:
-    async with asynctempfile.NamedTemporaryFile(delete=False) as temp_file:
-        await temp_file.write(await photo.read())
-        file_path = temp_file.name
-
-    img_processed, recognized_symbols = await plate_recognize(file_path)
-
-    if not recognized_symbols and not plate_number:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
-                            detail="License plate not recognized and not entered manually")
-
-    img_url, cloudinary_public_id = await cloud_service.upload_image(img_processed, 'Exit_photos')
-
-    picture = await create_image(session, recognized_symbols or plate_number, img_url, cloudinary_public_id)
-
-    history = await create_exit(recognized_symbols or plate_number, picture.id, session)
+    timer = StageTimer()
+    try:
+        with timer.stage("read"):
+            photo_bytes = await photo.read()
+        with timer.stage("recognition"):
+            img_processed, recognized_symbols, plate_rect = await recognition_service.recognize(
+                photo_bytes, timer.timings, camera_id, annotate=not config.DEFER_IMAGE_UPLOAD)
+
+        if not recognized_symbols and not plate_number:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail="License plate not recognized and not entered manually")
+
+        if config.DEFER_IMAGE_UPLOAD:
+            img_url, cloudinary_public_id = None, ""
+        else:
+            with timer.stage("upload"):
+                img_url, cloudinary_public_id = await storage.upload_image(img_processed, 'Exit_photos')
+
+        with timer.stage("db"):
+            image_id, history = await record_exit(session, recognized_symbols or plate_number, img_url or "",
+                                                  cloudinary_public_id,
+                                                  UploadStatus.pending if img_url is None else UploadStatus.uploaded)
+
+        if config.DEFER_IMAGE_UPLOAD:
+            with timer.stage("spool"):
+                await spool_image(image_id, photo_bytes, plate_rect, datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                                  'Exit_photos')
+    finally:
+        timer.observe(gate_stage_seconds, endpoint="exit")
+
+    if config.SERVER_TIMING:
+        response.headers["Server-Timing"] = timer.server_timing()
     return {"message": "Have a good trip!", "image_url": img_url, "plate_number": recognized_symbols or plate_number}
 
     # except Exception as e:
@@ -7,6 +7,7 @@ from src.repository.car import CarRepository
 from src.schemas.car import NewCarResponse
 from src.schemas.user import UserResponse, UserProfile, UserUpdate, UserTelegram
 from src.services.auth import auth_service
+from src.services.auth_cache import auth_cache
 from src.repository import users as repositories_users
 
 router = APIRouter(prefix="/users", tags=["Users"])
@@ -82,8 +83,10 @@ async def ban_user(user_id: int, token: str, db: AsyncSession = Depends(get_db))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
+    email = user.email  # the user is expired by the commit
     user.ban = True
     await db.commit()
+    auth_cache.invalidate_user(email)
     await auth_service.add_token_to_blacklist(user_id, token, db)
     return {"msg": "User has been banned"}
 
@@ -130,4 +133,5 @@ async def bind_chat_id(request: UserTelegram, db: AsyncSession = Depends(get_db)
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     user.chat_id = request.chat_id
     await db.commit()
+    auth_cache.invalidate_user(request.email)
     return {"message": "Chat ID bound successfully"}
@@ -1,5 +1,7 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 
 from fastapi import Depends, HTTPException, status
 from passlib.context import CryptContext
@@ -12,14 +14,44 @@ from src.database.db import get_db
 from src.entity.models import Blacklist
 from src.repository import users as repository_users
 from src.conf.config import config
+from src.services.auth_cache import auth_cache
+
+
+def create_pwd_context(scheme: str = "bcrypt") -> CryptContext:
+    """
+    The create_pwd_context function creates the password hashing context from the settings.
+    New hashes use the selected scheme and cost, hashes of the other scheme or with a lower cost
+    still verify and are reported as needing an update, so they are rehashed on the next login.
+
+    :param scheme: str: "bcrypt" or "argon2"
+    :return: The CryptContext used by Auth
+    """
+    if scheme not in ("bcrypt", "argon2"):
+        raise ValueError(f"Unknown password scheme: {scheme}")
+    if scheme == "argon2":
+        try:
+            import argon2
+        except ImportError:
+            raise RuntimeError("PASSWORD_SCHEME=argon2 requires argon2-cffi, install it with: pip install argon2-cffi")
+
+    return CryptContext(schemes=[scheme, "argon2" if scheme == "bcrypt" else "bcrypt"], deprecated="auto",
+                        bcrypt__default_rounds=config.BCRYPT_ROUNDS, bcrypt__min_rounds=config.BCRYPT_ROUNDS,
+                        argon2__default_rounds=config.ARGON2_TIME_COST, argon2__min_rounds=config.ARGON2_TIME_COST,
+                        argon2__memory_cost=config.ARGON2_MEMORY_COST, argon2__parallelism=config.ARGON2_PARALLELISM)
 
 
 class Auth:
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    pwd_context = create_pwd_context(config.PASSWORD_SCHEME)
     SECRET_KEY = config.SECRET_KEY_JWT
     ALGORITHM = config.ALGORITHM
+    # Hashing takes tens to hundreds of milliseconds of CPU, it runs in a few threads instead of the event loop
+    # (bcrypt and argon2 release the GIL), so a burst of logins waits for the pool and does not stall gate traffic
+    hash_executor = ThreadPoolExecutor(max_workers=config.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+
+    async def _run_in_executor(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.hash_executor, func, *args)
 
-    def verify_password(self, plain_password: str, hashed_password: str):
+    async def verify_password(self, plain_password: str, hashed_password: str):
         """
         The verify_password function takes a plain-text password and a hashed password as arguments.
         It then uses the pwd_context object to verify that the plain-text password matches the hashed
@@ -30,18 +62,30 @@ class Auth:
         :param hashed_password: Compare the password that is stored in the database to the one entered by a user
         :return: True if the password is correct and false otherwise
         """
-        return self.pwd_context.verify(plain_password, hashed_password)
+        return await self._run_in_executor(self.pwd_context.verify, plain_password, hashed_password)
+
+    async def verify_and_update_password(self, plain_password: str, hashed_password: str) -> Tuple[bool, str | None]:
+        """
+        The verify_and_update_password function verifies a password like verify_password and also
+        rehashes it when the stored hash uses another scheme or a lower cost than the settings.
+
+        :param self: Represent the instance of the class
+        :param plain_password: str: The password entered by the user
+        :param hashed_password: str: The hash stored in the database
+        :return: A tuple of True if the password is correct and the new hash to store, None if the hash is up to date
+        """
+        return await self._run_in_executor(self.pwd_context.verify_and_update, plain_password, hashed_password)
 
-    def get_password_hash(self, password: str):
+    async def get_password_hash(self, password: str):
         """
         The get_password_hash function takes a password as an argument and returns the hashed version of that password.
-        The hash is generated using the pwd_context object's hash method, which uses bcrypt to generate a secure hash.
+        The hash is generated using the pwd_context object's hash method, with the scheme selected by PASSWORD_SCHEME.
 
         :param self: Represent the instance of the class
         :param password: str: Pass the password to be hashed into the function
         :return: A hash of the password
         """
-        return self.pwd_context.hash(password)
+        return await self._run_in_executor(self.pwd_context.hash, password)
 
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
@@ -126,6 +170,7 @@ class Auth:
             new_blacklist_token = Blacklist(user_id=user_id, token=token)
             db.add(new_blacklist_token)
             await db.commit()
+        auth_cache.add_to_blacklist(token)
 
     @staticmethod
     async def is_token_blacklisted(token: str, db: AsyncSession = Depends(get_db)):
@@ -173,14 +218,22 @@ class Auth:
         except JWTError as e:
             raise credentials_exception
 
-        if await self.is_token_blacklisted(token, db):
+        if auth_cache.enabled:
+            blacklisted = await auth_cache.is_blacklisted(token, db)
+        else:
+            blacklisted = await self.is_token_blacklisted(token, db)
+        if blacklisted:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                                 detail="Token is blacklisted. Please log in again.",
                                 headers={"WWW-Authenticate": "Bearer"})
 
-        user = await repository_users.get_user_by_email(email, db)
+        # Gate cameras repeat the same token, its user is cached for a short time
+        user = auth_cache.get_user(token)
         if user is None:
-            raise credentials_exception
+            user = await repository_users.get_user_by_email(email, db)
+            if user is None:
+                raise credentials_exception
+            auth_cache.put_user(token, user, payload.get("exp"))
         if user.ban:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Your account has been banned.")
         return user
@@ -0,0 +1,138 @@
+import time
+
+from jose import JWTError, jwt
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+from src.conf.config import config
+from src.entity.models import Blacklist, User
+
+
+class AuthCache:
+    """
+    In-process cache of the authentication lookups done for every protected request.
+
+    Verified access tokens map to a snapshot of the columns of their user for at most ttl seconds
+    (and never past the expiry of the token), so a repeated token costs no database round trip.
+    The blacklist is kept as the set of blacklisted tokens that have not expired yet. It is updated right
+    away by add_token_to_blacklist and reloaded from the database every blacklist_refresh seconds,
+    for tokens blacklisted by other API processes. Changes to a user in this process invalidate its
+    cached tokens immediately, other processes see them after at most ttl seconds.
+    """
+
+    def __init__(self, ttl: float = 30, max_size: int = 10000, blacklist_refresh: float = 30):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.blacklist_refresh = blacklist_refresh
+        self._users: dict[str, tuple[float, str, dict]] = {}
+        self._blacklist: dict[str, float | None] = {}  # token -> its "exp" claim, None if it has none
+        self._blacklist_refreshed_at: float | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def get_user(self, token: str) -> User | None:
+        """
+        The get_user function returns the user of a cached token.
+
+        :param self: Represent the instance of the class
+        :param token: str: The access token
+        :return: A new User built from the cached columns, None if the token is not cached or expired.
+            It is detached like an object of a closed session: its relationships are not loaded,
+            and a change to it is only saved if it is added to a session.
+        """
+        entry = self._users.get(token)
+        if entry is None:
+            return None
+        expires_at, _, columns = entry
+        if expires_at <= time.monotonic():
+            self._users.pop(token, None)
+            return None
+        user = User(**columns)
+        make_transient_to_detached(user)
+        return user
+
+    def put_user(self, token: str, user: User, token_expires_at: float | None = None):
+        """
+        The put_user function caches the user of a verified token.
+
+        :param self: Represent the instance of the class
+        :param token: str: The access token
+        :param user: User: The user loaded from the database
+        :param token_expires_at: float | None: The "exp" claim of the token (unix time)
+        :return: None
+        """
+        if not self.enabled:
+            return
+        expires_in = self.ttl
+        if token_expires_at is not None:
+            expires_in = min(expires_in, token_expires_at - time.time())
+        if expires_in <= 0:
+            return
+
+        if len(self._users) >= self.max_size:
+            now = time.monotonic()
+            for cached_token in [t for t, (expires_at, _, _) in self._users.items() if expires_at <= now]:
+                del self._users[cached_token]
+            while len(self._users) >= self.max_size:
+                del self._users[next(iter(self._users))]  # the oldest entry
+
+        columns = {column.key: getattr(user, column.key) for column in User.__mapper__.column_attrs}
+        self._users[token] = (time.monotonic() + expires_in, user.email, columns)
+
+    def invalidate_user(self, email: str):
+        """
+        The invalidate_user function drops the cached tokens of a user, called when the user is changed or banned.
+
+        :param self: Represent the instance of the class
+        :param email: str: Email of the user
+        :return: None
+        """
+        for token in [t for t, (_, cached_email, _) in self._users.items() if cached_email == email]:
+            self._users.pop(token, None)
+
+    @staticmethod
+    def _token_expiry(token: str) -> float | None:
+        try:
+            return jwt.get_unverified_claims(token).get("exp")
+        except JWTError:
+            return None
+
+    def add_to_blacklist(self, token: str):
+        self._blacklist[token] = self._token_expiry(token)
+        self._users.pop(token, None)
+
+    async def is_blacklisted(self, token: str, db: AsyncSession) -> bool:
+        """
+        The is_blacklisted function checks a token against the cached blacklist, reloading it when it is due.
+        The whole blacklist is reloaded, so a row committed late by another process is never missed,
+        and the expired tokens are left out, as they are rejected anyway.
+
+        :param self: Represent the instance of the class
+        :param token: str: The access token
+        :param db: AsyncSession: The session used to reload the blacklist
+        :return: True if the token is blacklisted
+        """
+        now = time.monotonic()
+        if self._blacklist_refreshed_at is None or now - self._blacklist_refreshed_at >= self.blacklist_refresh:
+            loaded = {}
+            for blacklisted_token in (await db.execute(select(Blacklist.token))).scalars():
+                loaded[blacklisted_token] = self._token_expiry(blacklisted_token) if blacklisted_token else None
+            # Tokens are never removed from the blacklist, the ones added by this process while
+            # the query ran are kept too
+            loaded.update(self._blacklist)
+            unix_now = time.time()
+            self._blacklist = {blacklisted_token: expires_at for blacklisted_token, expires_at in loaded.items()
+                               if expires_at is None or expires_at > unix_now}
+            self._blacklist_refreshed_at = now
+        return token in self._blacklist
+
+    def clear(self):
+        self._users.clear()
+        self._blacklist.clear()
+        self._blacklist_refreshed_at = None
+
+
+auth_cache = AuthCache(config.AUTH_CACHE_TTL, config.AUTH_CACHE_SIZE, config.BLACKLIST_REFRESH_SECONDS)
@@ -50,17 +50,19 @@ class CloudService:
             raise HTTPException(status_code=500, detail=f"Unexpected error: {err}")
 
     @staticmethod
-    async def upload_image(image_file: bytes, folder_path: str = None):
+    async def upload_image(image_file: bytes, folder_path: str = None, public_id: str = None):
         """
         The upload_image function uploads an image to the cloudinary server.
 
         :param image_file: bytes: Bytes object representing the image file
         :param folder_path: str: Specify the folder in which the image will be uploaded to
+        :param public_id: str: Name of the image, an existing image with this name is kept instead of overwritten
         :return: A tuple of the image url and public_id
         """
+        options = {"public_id": public_id, "overwrite": False} if public_id else {}
         try:
             response = await asyncio.to_thread(cloudinary.uploader.upload, image_file,
-                                               folder=f"ParkSense-AI/{folder_path}")  # type: ignore
+                                               folder=f"ParkSense-AI/{folder_path}", **options)  # type: ignore
             return response['url'], response['public_id']
 
         except Exception as err:
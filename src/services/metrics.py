@@ -0,0 +1,156 @@
+import contextlib
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        """
+        The observe function records one measurement in the histogram.
+
+        :param self: Represent the instance of the class
+        :param value: float: The measured value, in seconds for latencies
+        :param labels: The label values of the series, e.g. stage="detect"
+        :return: None
+        """
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self) -> list[str]:
+        """
+        The render function returns the histogram in the Prometheus text exposition format.
+
+        :param self: Represent the instance of the class
+        :return: A list of lines
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                labels = [f'{name}="{value}"' for name, value in zip(self.labelnames, key)]
+                for bound, count in zip(self.buckets, series["buckets"]):
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    bucket_labels = ",".join(labels + [f'le="{le}"'])
+                    lines.append(f"{self.name}_bucket{{{bucket_labels}}} {count}")
+                suffix = "{" + ",".join(labels) + "}" if labels else ""
+                lines.append(f"{self.name}_sum{suffix} {series['sum']}")
+                lines.append(f"{self.name}_count{suffix} {series['count']}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, documentation: str, function):
+        self.name = name
+        self.documentation = documentation
+        self.function = function
+
+    def render(self) -> list[str]:
+        """
+        The render function returns the current value of the gauge in the Prometheus text exposition format.
+        The value is read from the function of the gauge when the metrics are scraped.
+
+        :param self: Represent the instance of the class
+        :return: A list of lines
+        """
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge",
+                f"{self.name} {self.function()}"]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (),
+                  buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        histogram = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(histogram)
+        return histogram
+
+    def gauge(self, name: str, documentation: str, function) -> Gauge:
+        gauge = Gauge(name, documentation, function)
+        self._metrics.append(gauge)
+        return gauge
+
+    def render(self) -> str:
+        """
+        The render function returns all registered metrics for the /metrics endpoint.
+
+        :param self: Represent the instance of the class
+        :return: The metrics in the Prometheus text exposition format
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class StageTimer:
+    def __init__(self):
+        self.timings: dict[str, float] = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """
+        The stage function measures the time spent in a block of code under the given stage name.
+
+        :param self: Represent the instance of the class
+        :param name: str: Name of the stage, e.g. "upload"
+        :return: A context manager
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    def observe(self, histogram: Histogram, **labels):
+        """
+        The observe function records every measured stage in a histogram with a stage label.
+
+        :param self: Represent the instance of the class
+        :param histogram: Histogram: The histogram to record the stages in
+        :param labels: Other label values of the series, e.g. endpoint="entry"
+        :return: None
+        """
+        for name, seconds in self.timings.items():
+            histogram.observe(seconds, stage=name, **labels)
+
+    def server_timing(self) -> str:
+        """
+        The server_timing function formats the measured stages as a Server-Timing header value.
+
+        :param self: Represent the instance of the class
+        :return: For example "recognition;dur=182.4, upload;dur=310.0"
+        """
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.timings.items())
+
+
+metrics = MetricsRegistry()
+
+gate_stage_seconds = metrics.histogram(
+    "parksense_gate_stage_seconds",
+    "Time spent in each stage of a parking entry/exit request",
+    labelnames=("endpoint", "stage"),
+)
+
+db_pool_wait_seconds = metrics.histogram(
+    "parksense_db_pool_wait_seconds",
+    "Time spent waiting for a database connection from the pool",
+)
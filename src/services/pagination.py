@@ -0,0 +1,73 @@
+from typing import Iterable, Optional, Sequence
+
+from fastapi import HTTPException, Query, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from src.conf.config import config
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class Pagination:
+    """
+    Query parameters of a keyset paginated list: the rows with an id greater than after_id in id order,
+    at most limit of them, optionally with only some of their fields.
+    Paging is opt-in: without a limit the whole list is returned, as before the lists were paginated.
+    The id of the last row is returned in the X-Next-Cursor header when there is a next page.
+    """
+
+    def __init__(self,
+                 after_id: Optional[int] = Query(None, description="The X-Next-Cursor header of the previous page"),
+                 limit: Optional[int] = Query(None, ge=1, le=config.PAGE_MAX_LIMIT,
+                                              description="Rows per page, the whole list if not given"),
+                 fields: Optional[str] = Query(None, description="Comma separated fields to return, all by default")):
+        self.after_id = after_id
+        self.limit = limit
+        self.fields = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+
+    @property
+    def fetch_limit(self) -> Optional[int]:
+        # One row more than the page, it tells whether there is a next page
+        return self.limit + 1 if self.limit is not None else None
+
+    def field_names(self, allowed: Iterable[str]) -> list[str]:
+        """
+        The field_names function returns the fields requested by the client.
+
+        :param self: Represent the instance of the class
+        :param allowed: Iterable[str]: The fields of the listed items
+        :return: The requested fields, all allowed fields if none were requested
+        """
+        allowed = list(allowed)
+        if self.fields is None:
+            return allowed
+        unknown = [field for field in self.fields if field not in allowed]
+        if unknown:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(allowed)}")
+        return self.fields
+
+    def response(self, response: Response, rows: Sequence):
+        """
+        The response function turns the rows read with fetch_limit into a page.
+        The extra row only tells that there is a next page, its cursor is set in the X-Next-Cursor header.
+
+        :param self: Represent the instance of the class
+        :param response: Response: The response of the route, receives the header
+        :param rows: Sequence: Mappings with an "id" key, at most fetch_limit of them
+        :return: The rows for the response model of the route, or a JSONResponse with only the requested fields
+        """
+        rows = list(rows)
+        headers = {}
+        if self.limit is not None and len(rows) > self.limit:
+            rows = rows[:self.limit]
+            headers[NEXT_CURSOR_HEADER] = str(rows[-1]["id"])
+
+        if self.fields is None:
+            response.headers.update(headers)
+            return rows
+        # The response model of the route requires all fields, a projection is returned as is
+        names = ["id"] + [field for field in self.fields if field != "id"]
+        content = [{name: row[name] for name in names} for row in rows]
+        return JSONResponse(jsonable_encoder(content), headers=headers)
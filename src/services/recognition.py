@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from concurrent.futures import BrokenExecutor, Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from fastapi import HTTPException, status
+
+from src.conf.config import config
+
+
+def _init_worker():
+    """
+    The _init_worker function is submitted to the workers of the pool by warmup.
+    It loads the Haar cascade and the Keras model and runs a dummy inference,
+    so the first photo handled by the worker does not pay for it.
+    It is not the initializer of the pool: a failing initializer breaks the pool for good.
+
+    :return: None
+    """
+    from DS.functions.recognizer import recognizer
+
+    recognizer.warmup()
+
+
+def _recognize(photo, camera=None, annotate=True):
+    """
+    The _recognize function runs the blocking recognition pipeline inside a worker.
+    It is a module level function so that it can be pickled for a process pool.
+
+    :param photo: Encoded image bytes of the car with a license plate
+    :param camera: Identifier of the gate camera, selects its detection region of interest
+    :param annotate: Draw the plate box on the photo and encode it, skipped when the image is rendered later
+    :return: A tuple of the processed image bytes (None without annotation), the recognized plate number,
+        the boxes of the detected plates and the stage timings
+    """
+    from DS.functions.image_process import annotate_image, encode_image, read_plate
+
+    timings = {}
+    img, plate_rect, recognized_symbols = read_plate(photo, timings, camera)
+    img_bytes = None
+    if annotate:
+        start = time.perf_counter()
+        img_bytes = encode_image(annotate_image(img, plate_rect, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        timings["encode"] = time.perf_counter() - start
+    return img_bytes, recognized_symbols, plate_rect, timings
+
+
+def _render(photo, plate_rect, text):
+    """
+    The _render function draws the plate boxes and the text on a photo and encodes it inside a worker.
+
+    :param photo: Encoded image bytes of the car with a license plate
+    :param plate_rect: The boxes of the detected plates returned by _recognize
+    :param text: The text drawn on the image, the date and time of the gate event
+    :return: The encoded annotated image
+    """
+    from DS.functions.image_process import render_plate_image
+
+    return render_plate_image(photo, plate_rect, text)
+
+
+class RecognitionService:
+    def __init__(self, executor_type: str = "thread", max_workers: int = 2, max_pending: int = 8):
+        self.executor_type = executor_type
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor: Executor | None = None
+        self._pending = 0
+        self.ready = False
+
+    def _get_executor(self) -> Executor:
+        """
+        The _get_executor function creates the worker pool on first use, and again after a broken pool
+        was dropped. The workers of a process pool load the cascade and the model themselves,
+        a thread pool shares the ones loaded in the API process.
+
+        :param self: Represent the instance of the class
+        :return: The executor used for recognition
+        """
+        if self._executor is None:
+            if self.executor_type == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            elif self.executor_type == "thread":
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="recognition")
+            else:
+                raise ValueError(f"Unknown recognition executor type: {self.executor_type}")
+        return self._executor
+
+    def _drop_executor(self, executor: Executor):
+        # A pool whose worker process died accepts no more work, the next call creates a new one
+        if self._executor is executor:
+            self._executor = None
+            self.ready = False
+        executor.shutdown(wait=False)
+
+    async def _run(self, fn, *args):
+        executor = self._get_executor()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+        except BrokenExecutor:
+            self._drop_executor(executor)
+            logging.exception("Recognition worker pool is broken, it is recreated on the next request")
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="Recognition service is restarting, please retry later",
+                                headers={"Retry-After": "1"})
+
+    async def recognize(self, photo, timings: dict | None = None, camera: str | None = None, annotate: bool = True):
+        """
+        The recognize function submits a photo to the recognition worker pool and awaits the result.
+        Only max_pending photos may be running or queued at the same time, when the pool is saturated
+        the request is rejected with 429 so the gate can retry instead of piling up behind other gates.
+
+        :param self: Represent the instance of the class
+        :param photo: Encoded image bytes of the car with a license plate
+        :param timings: dict | None: Receives the duration in seconds of every recognition stage,
+            "queue" is the time spent waiting for a worker
+        :param camera: str | None: Identifier of the gate camera, selects its detection region of interest
+        :param annotate: bool: Return the annotated image, False leaves it to render() after the response
+        :return: A tuple of the processed image bytes (None without annotation), the recognized plate number
+            and the boxes of the detected plates
+        """
+        if self._pending >= self.max_pending:
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                                detail="Recognition service is busy, please retry later",
+                                headers={"Retry-After": "1"})
+
+        self._pending += 1
+        try:
+            start = time.perf_counter()
+            img_bytes, recognized_symbols, plate_rect, stage_timings = await self._run(
+                _recognize, photo, camera, annotate)
+            if timings is not None:
+                timings["queue"] = max(time.perf_counter() - start - sum(stage_timings.values()), 0.0)
+                timings.update(stage_timings)
+            self.ready = True
+            return img_bytes, recognized_symbols, plate_rect
+        except ValueError as err:
+            from DS.functions.image_process import ImageDecodeError
+
+            # Only an unreadable photo is the fault of the client, other errors are server errors
+            if isinstance(err, ImageDecodeError):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
+            raise
+        finally:
+            self._pending -= 1
+
+    async def render(self, photo, plate_rect: list, text: str) -> bytes:
+        """
+        The render function draws the plate boxes on a photo and encodes it in the worker pool.
+        It is used after the response when the image upload is deferred, so it is not limited by max_pending.
+
+        :param self: Represent the instance of the class
+        :param photo: Encoded image bytes of the car with a license plate
+        :param plate_rect: list: The boxes of the detected plates returned by recognize
+        :param text: str: The text drawn on the image, the date and time of the gate event
+        :return: The encoded annotated image
+        """
+        return await self._run(_render, photo, plate_rect, text)
+
+    async def warmup(self):
+        """
+        The warmup function starts the worker pool and loads the cascade and the model in it,
+        after that the service reports itself as ready. A failed warmup leaves the pool usable,
+        the model is then loaded by the first recognition.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        try:
+            await asyncio.gather(*(self._run(_init_worker) for _ in range(self.max_workers)))
+        except Exception as err:
+            logging.error(f"Recognition warmup failed: {err}")
+            return
+        self.ready = True
+
+    async def shutdown(self):
+        """
+        The shutdown function stops the worker pool, waiting for the running recognitions to finish
+        in a thread, so the event loop keeps serving the requests that are still running.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            self.ready = False
+            await asyncio.to_thread(executor.shutdown, wait=True)
+
+
+recognition_service = RecognitionService(config.RECOGNITION_EXECUTOR, config.RECOGNITION_WORKERS,
+                                         config.RECOGNITION_MAX_PENDING)
@@ -0,0 +1,211 @@
+import asyncio
+import hashlib
+import os
+import uuid
+from pathlib import Path
+
+from fastapi import HTTPException
+
+from src.conf.config import config
+
+STATIC_DIR = Path(__file__).resolve().parent.parent / "static"
+
+CONTENT_TYPES = {"png": "image/png", "jpg": "image/jpeg", "webp": "image/webp", "bin": "application/octet-stream"}
+
+
+def guess_extension(image_file: bytes) -> str:
+    """
+    The guess_extension function recognizes the format of an encoded image by its first bytes.
+
+    :param image_file: bytes: The encoded image
+    :return: The file extension without a dot, "bin" for an unknown format
+    """
+    if image_file.startswith(b"\x89PNG"):
+        return "png"
+    if image_file.startswith(b"\xff\xd8"):
+        return "jpg"
+    if image_file[:4] == b"RIFF" and image_file[8:12] == b"WEBP":
+        return "webp"
+    return "bin"
+
+
+def content_hash(image_file: bytes) -> str:
+    """
+    The content_hash function returns the SHA-256 of an image, used as its name in the storage.
+    The stored bytes themselves are hashed, so a name always refers to one content: an upload retried
+    after a failure or a restart does not store the image twice, and the image of a gate event
+    (with its time drawn on it) is never replaced by the image of another event.
+
+    :param image_file: bytes: The encoded image
+    :return: The hex digest
+    """
+    return hashlib.sha256(image_file).hexdigest()
+
+
+class LocalStorage:
+    """
+    Stores the images in a local directory served by the /static mount.
+    It has the same interface as CloudService, so it can stand in for Cloudinary
+    on a gate without an uplink and in offline tests.
+
+    The images are content addressed: identical images share one file, so a file may be
+    referenced by several Image rows.
+    """
+
+    def __init__(self, root: Path = STATIC_DIR, prefix: str = "uploads"):
+        self.root = root
+        self.prefix = prefix
+
+    def _write(self, image_file: bytes, public_id: str) -> None:
+        path = self.root / public_id
+        if path.exists():
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Written under a unique temporary name first, so a half written file is never served
+        tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        tmp_path.write_bytes(image_file)
+        tmp_path.replace(path)
+
+    async def upload_image(self, image_file: bytes, folder_path: str = None):
+        """
+        The upload_image function writes an image to the local storage directory,
+        unless the same image is already stored there.
+
+        :param self: Represent the instance of the class
+        :param image_file: bytes: Bytes object representing the image file
+        :param folder_path: str: Not used, the images are stored by their content hash
+        :return: A tuple of the image url and public_id
+        """
+        digest = content_hash(image_file)
+        public_id = f"{self.prefix}/{digest[:2]}/{digest}.{guess_extension(image_file)}"
+        try:
+            await asyncio.to_thread(self._write, image_file, public_id)
+        except OSError as err:
+            raise HTTPException(status_code=500, detail=f"I/O error: {err}")
+        return f"/static/{public_id}", public_id
+
+    async def delete_image(self, public_id: str):
+        """
+        The delete_image function removes an image from the local storage directory.
+
+        :param self: Represent the instance of the class
+        :param public_id: str: Identify the image to be deleted
+        :return: None
+        """
+        try:
+            await asyncio.to_thread(os.remove, self.root / public_id)
+        except FileNotFoundError:
+            pass
+
+
+class S3Storage:
+    """
+    Stores the images in an S3 compatible bucket (AWS S3, MinIO, ...), content addressed like LocalStorage.
+    boto3 is only needed when this storage is selected.
+    """
+
+    def __init__(self, bucket: str, endpoint_url: str = None, region: str = None, access_key: str = None,
+                 secret_key: str = None, public_url: str = None, prefix: str = "ParkSense-AI"):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("IMAGE_STORAGE=s3 requires boto3, install it with: pip install boto3")
+
+        self.client = boto3.client("s3", endpoint_url=endpoint_url or None, region_name=region or None,
+                                   aws_access_key_id=access_key or None, aws_secret_access_key=secret_key or None)
+        self.bucket = bucket
+        self.prefix = prefix
+        if public_url:
+            self.public_url = public_url.rstrip("/")
+        elif endpoint_url:
+            self.public_url = f"{endpoint_url.rstrip('/')}/{bucket}"
+        else:
+            self.public_url = f"https://{bucket}.s3.amazonaws.com"
+
+    def _put(self, image_file: bytes, key: str, content_type: str) -> None:
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return  # an identical image is already stored
+        except ClientError as err:
+            if err.response.get("Error", {}).get("Code") not in ("404", "NoSuchKey", "NotFound"):
+                raise
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=image_file, ContentType=content_type)
+
+    async def upload_image(self, image_file: bytes, folder_path: str = None):
+        """
+        The upload_image function uploads an image to the bucket, unless the same image is already stored.
+
+        :param self: Represent the instance of the class
+        :param image_file: bytes: Bytes object representing the image file
+        :param folder_path: str: Not used, the images are stored by their content hash
+        :return: A tuple of the image url and the object key
+        """
+        extension = guess_extension(image_file)
+        key = f"{self.prefix}/{content_hash(image_file)}.{extension}"
+        try:
+            await asyncio.to_thread(self._put, image_file, key, CONTENT_TYPES[extension])
+        except Exception as err:
+            raise HTTPException(status_code=500, detail=f"S3 error: {err}")
+        return f"{self.public_url}/{key}", key
+
+    async def delete_image(self, public_id: str):
+        """
+        The delete_image function removes an image from the bucket.
+
+        :param self: Represent the instance of the class
+        :param public_id: str: The object key of the image
+        :return: None
+        """
+        try:
+            await asyncio.to_thread(self.client.delete_object, Bucket=self.bucket, Key=public_id)
+        except Exception as err:
+            raise HTTPException(status_code=500, detail=f"S3 error: {err}")
+
+
+class CloudinaryStorage:
+    """
+    Stores the images in Cloudinary through cloud_service, named by their content hash in one folder
+    (not per gate folder), so the same image is not stored twice.
+    """
+
+    def __init__(self, folder: str = "images"):
+        from src.services.cloud_service import cloud_service
+
+        self.cloud_service = cloud_service
+        self.folder = folder
+
+    async def upload_image(self, image_file: bytes, folder_path: str = None):
+        """
+        The upload_image function uploads an image to Cloudinary under its content hash.
+
+        :param self: Represent the instance of the class
+        :param image_file: bytes: Bytes object representing the image file
+        :param folder_path: str: Not used, the images are stored by their content hash
+        :return: A tuple of the image url and public_id
+        """
+        return await self.cloud_service.upload_image(image_file, self.folder,
+                                                     public_id=content_hash(image_file))
+
+    async def delete_image(self, public_id: str):
+        await self.cloud_service.delete_image(public_id)
+
+
+def get_storage():
+    """
+    The get_storage function returns the image storage selected by the IMAGE_STORAGE setting.
+
+    :return: The storage service for "cloudinary", "local" or "s3"
+    """
+    if config.IMAGE_STORAGE == "local":
+        return LocalStorage()
+    if config.IMAGE_STORAGE == "s3":
+        return S3Storage(config.S3_BUCKET, config.S3_ENDPOINT_URL, config.S3_REGION, config.S3_ACCESS_KEY,
+                         config.S3_SECRET_KEY, config.S3_PUBLIC_URL)
+    if config.IMAGE_STORAGE == "cloudinary":
+        return CloudinaryStorage()
+    raise ValueError(f"Unknown image storage: {config.IMAGE_STORAGE}")
+
+
+storage = get_storage()
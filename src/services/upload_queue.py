@@ -0,0 +1,198 @@
+import asyncio
+import json
+import logging
+import os
+from pathlib import Path
+
+from src.conf.config import config
+from src.database.db import sessionmanager
+from src.entity.models import UploadStatus
+from src.repository.image import set_image_upload_status, update_image_url
+from src.services.recognition import recognition_service
+from src.services.storage import storage
+
+SEPARATOR = "__"
+RENDER_SUFFIX = ".render"  # a spooled original photo, annotated by the worker before the upload
+INFLIGHT = ".inflight-"  # a spooled image claimed for upload by the process whose pid follows
+
+
+def _process_alive(pid: int) -> bool:
+    # At start this process has claimed nothing yet, a claim with its pid was left by a process that had it before
+    if pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class UploadQueue:
+    """
+    Uploads the gate photos in the background so the gate response does not wait for the storage.
+
+    Every image is first written to the spool directory, so it survives a failed upload or a restart:
+    the spool is scanned again on start. A bounded number of workers upload the spooled images with
+    exponential backoff between attempts and store the url in the Image row when done.
+    All API processes of a host share the spool, so a worker claims an image by renaming it before
+    the upload; the rename succeeds for one process only and the image is uploaded once.
+    An original photo can be spooled with the plate boxes and the text to draw, the worker annotates
+    it before the upload, so the gate response waits only for the spool write.
+    """
+
+    def __init__(self, spool_dir: str, workers: int = 2, max_retries: int = 5, retry_backoff: float = 1.0):
+        self.spool_dir = Path(spool_dir)
+        self.workers = workers
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._queue: asyncio.Queue | None = None
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self):
+        """
+        The start function creates the spool directory, queues the images left in it by a previous run,
+        including those claimed by a process that stopped before the upload, and starts the upload workers.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue()
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        for path in sorted(self.spool_dir.iterdir()):
+            if INFLIGHT in path.name:
+                name, pid = path.name.rsplit(INFLIGHT, 1)
+                if _process_alive(int(pid)):
+                    continue
+                try:
+                    path = path.replace(path.with_name(name))
+                except FileNotFoundError:
+                    continue  # released by another process that is starting
+            elif SEPARATOR not in path.name or path.suffix == ".tmp":
+                continue
+            self._queue.put_nowait(path)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """
+        The stop function cancels the upload workers, the images not uploaded yet stay in the spool.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def _write(self, path: Path, image_file: bytes) -> None:
+        # Written under a temporary name and synced first, so a crash never leaves a truncated image in the spool
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as file:
+            file.write(image_file)
+            file.flush()
+            os.fsync(file.fileno())
+        tmp_path.replace(path)
+
+    async def enqueue(self, image_id: int, image_file: bytes, folder_path: str):
+        """
+        The enqueue function spools an image and queues it for upload.
+
+        :param self: Represent the instance of the class
+        :param image_id: int: Id of the Image row that receives the url
+        :param image_file: bytes: The encoded image
+        :param folder_path: str: The storage folder, e.g. Entry_photos
+        :return: None
+        """
+        await self.start()
+        path = self.spool_dir / f"{image_id}{SEPARATOR}{folder_path}"
+        await asyncio.to_thread(self._write, path, image_file)
+        self._queue.put_nowait(path)
+
+    async def enqueue_photo(self, image_id: int, photo: bytes, plate_rect: list, text: str, folder_path: str):
+        """
+        The enqueue_photo function spools an original gate photo with what has to be drawn on it,
+        the worker renders the annotated image and uploads it. The photo is on disk when it returns.
+
+        :param self: Represent the instance of the class
+        :param image_id: int: Id of the Image row that receives the url
+        :param photo: bytes: The original photo of the car
+        :param plate_rect: list: The (x, y, w, h) boxes of the detected plates
+        :param text: str: The date and time of the gate event, drawn on the image
+        :param folder_path: str: The storage folder, e.g. Entry_photos
+        :return: None
+        """
+        await self.start()
+        # One JSON line with the drawing parameters, followed by the photo
+        header = json.dumps({"plate_rect": [[int(value) for value in rect] for rect in plate_rect], "text": text})
+        path = self.spool_dir / f"{image_id}{SEPARATOR}{folder_path}{RENDER_SUFFIX}"
+        await asyncio.to_thread(self._write, path, header.encode() + b"\n" + photo)
+        self._queue.put_nowait(path)
+
+    @staticmethod
+    def _claim(path: Path) -> Path | None:
+        claimed = path.with_name(f"{path.name}{INFLIGHT}{os.getpid()}")
+        try:
+            return path.rename(claimed)
+        except FileNotFoundError:
+            return None  # claimed by another process
+
+    async def _worker(self):
+        while True:
+            path = await self._queue.get()
+            try:
+                await self._upload(path)
+            except Exception as err:
+                logging.error(f"Upload of {path.name} failed: {err}")
+            finally:
+                self._queue.task_done()
+
+    async def _upload(self, path: Path):
+        claimed = await asyncio.to_thread(self._claim, path)
+        if claimed is None:
+            return
+        try:
+            await self._upload_claimed(path, claimed)
+        except Exception:
+            # The image stays in the spool and is retried on the next start
+            await asyncio.to_thread(claimed.replace, path)
+            raise
+        claimed.unlink(missing_ok=True)
+
+    async def _upload_claimed(self, path: Path, claimed: Path):
+        name = path.stem if path.suffix == RENDER_SUFFIX else path.name
+        image_id, folder_path = name.split(SEPARATOR, 1)
+        image_file = await asyncio.to_thread(claimed.read_bytes)
+        if path.suffix == RENDER_SUFFIX:
+            try:
+                header, photo = image_file.split(b"\n", 1)
+                header = json.loads(header)
+                image_file = await recognition_service.render(photo, header["plate_rect"], header["text"])
+            except Exception:
+                async with sessionmanager.session() as session:
+                    await set_image_upload_status(session, int(image_id), UploadStatus.failed)
+                raise
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                url, public_id = await storage.upload_image(image_file, folder_path)
+                break
+            except Exception as err:
+                if attempt == self.max_retries:
+                    async with sessionmanager.session() as session:
+                        await set_image_upload_status(session, int(image_id), UploadStatus.failed)
+                    raise
+                delay = min(self.retry_backoff * 2 ** attempt, 60.0)
+                logging.warning(f"Upload of {path.name} failed ({err}), retrying in {delay:.0f}s")
+                await asyncio.sleep(delay)
+
+        async with sessionmanager.session() as session:
+            await update_image_url(session, int(image_id), url, public_id)
+
+
+upload_queue = UploadQueue(config.UPLOAD_SPOOL_DIR, config.UPLOAD_WORKERS, config.UPLOAD_MAX_RETRIES,
+                           config.UPLOAD_RETRY_BACKOFF)
@@ -1,14 +1,26 @@
+import contextlib
+import os
+import tempfile
+
+# The tests run against a SQLite file unless a database is set explicitly, set before the app reads its config
+TEST_DIR = tempfile.mkdtemp(prefix="parksense-tests-")
+os.environ.setdefault("SQLALCHEMY_DATABASE_URL", f"sqlite+aiosqlite:///{TEST_DIR}/test.db")
+os.environ.setdefault("IMAGE_STORAGE", "local")
+os.environ.setdefault("UPLOAD_SPOOL_DIR", f"{TEST_DIR}/spool")
+os.environ.setdefault("MAIL_FROM", "parksense@example.com")
+
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, make_url
 from sqlalchemy.orm import sessionmaker
 
 from main import app
 from src.conf.config import config
-from src.database.db import get_db
+from src.database.db import get_db, sessionmanager
 from src.entity.models import Base
 
-SQLALCHEMY_DATABASE_URL = config.SQLALCHEMY_DATABASE_URL
+# The app uses the async driver, the fixtures use the sync one on the same database
+SQLALCHEMY_DATABASE_URL = make_url(config.SQLALCHEMY_DATABASE_URL).set(drivername="sqlite")
 
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -40,14 +52,12 @@ def client(session):
     It also handles setting up the database and closing it when the tests are done.
     The function takes a session as an argument, which allows you to pass in different sessions for different tests.
 
-    :param session: Override the get_db function in app
+    :param session: Creates the tables the app works with
     :return: A test client object
     """
-    def override_get_db():
-        try:
-            yield session
-        finally:
-            session.close()
+    async def override_get_db():
+        async with sessionmanager.session() as db:
+            yield db
 
     app.dependency_overrides[get_db] = override_get_db
 
@@ -58,8 +68,33 @@ def client(session):
 def user():
     """
     The user function returns a dictionary with the following keys:
-        username, email, password.
+        username, email, password, phone_number.
 
     :return: A dictionary with the user information
     """
-    return {"username": "test_name", "email": "test@email.com", "password": "12345678"}
+    return {"username": "test_name", "email": "test@email.com", "password": "12345678", "phone_number": "380501234567"}
+
+
+@pytest.fixture
+def capture_statements():
+    """
+    The capture_statements function is a fixture that returns a context manager recording the statements
+    the app sends to the database, as (statement, parameters) tuples, while the context is open.
+
+    :return: A function creating the context manager
+    """
+    @contextlib.contextmanager
+    def capture():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append((statement, parameters))
+
+        app_engine = sessionmanager._engine.sync_engine
+        event.listen(app_engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(app_engine, "before_cursor_execute", before_cursor_execute)
+
+    return capture
@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+from jose import jwt
+
+from src.database.db import sessionmanager
+from src.entity.models import Blacklist
+from src.services.auth_cache import AuthCache, auth_cache
+
+
+def login(client, user):
+    response = client.post("/api/auth/login", data={"username": user["email"], "password": user["password"]})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_signup(client, user):
+    response = client.post("/api/auth/signup", json=user)
+    assert response.status_code == 201, response.text
+    assert response.json()["email"] == user["email"]
+
+
+def test_login(client, user):
+    tokens = login(client, user)
+    assert tokens["token_type"] == "bearer"
+    assert tokens["access_token"] and tokens["refresh_token"]
+
+
+def test_login_wrong_password(client, user):
+    response = client.post("/api/auth/login", data={"username": user["email"], "password": "wrong"})
+    assert response.status_code == 401
+
+
+def test_refresh_token(client, user):
+    tokens = login(client, user)
+    response = client.get("/api/auth/refresh_token", headers={"Authorization": f"Bearer {tokens['refresh_token']}"})
+    assert response.status_code == 200, response.text
+    assert response.json()["refresh_token"]
+
+
+def test_me_is_cached(client, user):
+    access_token = login(client, user)["access_token"]
+    headers = {"Authorization": f"Bearer {access_token}"}
+    for _ in range(2):
+        response = client.get("/api/users/me", headers=headers)
+        assert response.status_code == 200, response.text
+        assert response.json()["email"] == user["email"]
+    assert auth_cache.get_user(access_token).email == user["email"]
+
+
+def test_ban_revokes_cached_token(client, user):
+    access_token = login(client, user)["access_token"]
+    headers = {"Authorization": f"Bearer {access_token}"}
+    me = client.get("/api/users/me", headers=headers)
+    assert me.status_code == 200, me.text
+
+    response = client.post(f"/api/users/ban_user/{me.json()['id']}", params={"token": access_token})
+    assert response.status_code == 200, response.text
+
+    assert auth_cache.get_user(access_token) is None
+    assert client.get("/api/users/me", headers=headers).status_code in (401, 403)
+    response = client.post("/api/auth/login", data={"username": user["email"], "password": user["password"]})
+    assert response.status_code == 403
+
+
+def test_blacklist_reload_finds_late_rows_and_drops_expired(session):
+    def token(exp):
+        return jwt.encode({"sub": "test@email.com", "exp": exp}, "secret", algorithm="HS256")
+
+    valid, expired, late = token(time.time() + 600), token(time.time() - 1), token(time.time() + 600)
+    session.add_all([Blacklist(id=100, token=valid), Blacklist(id=101, token=expired)])
+    session.commit()
+    cache = AuthCache(blacklist_refresh=0)
+
+    async def check(checked_token):
+        async with sessionmanager.session() as db:
+            return await cache.is_blacklisted(checked_token, db)
+
+    assert asyncio.run(check(valid))
+    assert not asyncio.run(check(expired))
+    assert expired not in cache._blacklist
+
+    # A row committed after the last reload with a lower id than the rows already seen
+    session.add(Blacklist(id=50, token=late))
+    session.commit()
+    assert asyncio.run(check(late))
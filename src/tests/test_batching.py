@@ -0,0 +1,38 @@
+import threading
+
+import numpy as np
+
+from DS.functions.batching import MicroBatcher
+
+CALLERS = 4
+
+
+def test_concurrent_callers_share_one_model_call():
+    calls = []
+
+    def predict(batch):
+        calls.append(len(batch))
+        # The probabilities of a character identify the character, here its first pixel
+        return batch[:, 0, 0, :1].repeat(36, axis=1)
+
+    batcher = MicroBatcher(predict, max_batch_size=2 * CALLERS, max_wait=5.0)
+    start = threading.Barrier(CALLERS)
+    results = {}
+
+    def classify(caller):
+        images = np.full((2, 28, 28, 3), caller, dtype=np.float32)
+        start.wait()
+        results[caller] = batcher.classify(images)
+
+    threads = [threading.Thread(target=classify, args=(caller,)) for caller in range(CALLERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    # The batch is full before the wait ends, so every caller is served by one call
+    assert calls == [2 * CALLERS]
+    for caller in range(CALLERS):
+        assert results[caller].shape == (2, 36)
+        assert (results[caller] == caller).all()
+
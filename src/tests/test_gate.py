@@ -0,0 +1,71 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, event, func, select
+
+from src.database.db import sessionmanager
+from src.entity.models import Car, History, Occupancy
+from src.repository import gate
+from src.repository.occupancy import LOT_ID, reconcile_occupancy
+
+PLATE = "AA0001BB"
+
+
+def test_double_exit_closes_and_charges_once(session, monkeypatch):
+    car = Car(plate=PLATE, credit=100.0)
+    session.add_all([car, Occupancy(id=LOT_ID, occupied=1),
+                     History(car=car, entry_time=datetime.now() - timedelta(hours=2))])
+    session.commit()
+
+    insert_image = gate.insert_image
+    second_exit = []
+
+    async def exit_twice(db, *args, **kwargs):
+        monkeypatch.setattr(gate, "insert_image", insert_image)
+        # The second camera event runs to the end after the first one has read the open session
+        async with sessionmanager.session() as other_db:
+            second_exit.append(await gate.record_exit(other_db, PLATE, "", ""))
+        return await insert_image(db, *args, **kwargs)
+
+    monkeypatch.setattr(gate, "insert_image", exit_twice)
+
+    async def first_exit():
+        async with sessionmanager.session() as db:
+            return await gate.record_exit(db, PLATE, "", "")
+
+    _, first_history = asyncio.run(first_exit())
+    _, second_history = second_exit[0]
+
+    assert second_history is not None and second_history.exit_time is not None
+    assert first_history is None
+    session.expire_all()
+    assert session.scalar(select(Occupancy.occupied).where(Occupancy.id == LOT_ID)) == 0
+    assert session.scalar(select(Car.credit).where(Car.plate == PLATE)) == 100.0 - second_history.cost
+
+
+def test_reconcile_tolerates_a_concurrently_created_counter(session):
+    session.execute(delete(Occupancy))
+    session.add(History(entry_time=datetime.now()))
+    session.commit()
+    open_sessions = session.scalar(select(func.count(History.id)).where(History.exit_time.is_(None)))
+
+    def create_counter_first(conn, cursor, statement, parameters, context, executemany):
+        # Another request creates the missing row just before this one inserts it
+        if statement.startswith("INSERT INTO occupancy") and session.get(Occupancy, LOT_ID) is None:
+            session.add(Occupancy(id=LOT_ID, occupied=open_sessions))
+            session.commit()
+
+    async def reconcile():
+        async with sessionmanager.session() as db:
+            occupied = await reconcile_occupancy(db)
+            await db.commit()
+            return occupied
+
+    engine = sessionmanager._engine.sync_engine
+    event.listen(engine, "before_cursor_execute", create_counter_first)
+    try:
+        assert asyncio.run(reconcile()) == open_sessions
+    finally:
+        event.remove(engine, "before_cursor_execute", create_counter_first)
+    session.expire_all()
+    assert session.scalars(select(Occupancy.occupied)).all() == [open_sessions]
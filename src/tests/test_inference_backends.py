@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from DS.functions.backends import KerasBackend, NumpyBackend, load_backend
+from DS.functions.configuration import MODEL
+from DS.functions.dataset import load_validation_set
+from DS.functions.export_model import check_parity, export_numpy, export_onnx
+
+VAL_DIR = "DS/data/val"
+
+
+def reference_predict(weights, batch):
+    # Direct per-offset convolution, independent of the im2col patches of NumpyBackend
+    x = batch
+    i = 0
+    while f"conv{i}_kernel" in weights:
+        kernel, bias = weights[f"conv{i}_kernel"], weights[f"conv{i}_bias"]
+        kh, kw = kernel.shape[:2]
+        n, h, w, _ = x.shape
+        padded = np.pad(x, ((0, 0), (kh // 2, kh // 2), (kw // 2, kw // 2), (0, 0)))
+        out = sum(padded[:, dy:dy + h, dx:dx + w, :] @ kernel[dy, dx] for dy in range(kh) for dx in range(kw))
+        x = np.maximum(out + bias, 0)
+        n, h, w, c = x.shape
+        x = x[:, :h // 2 * 2, :w // 2 * 2, :].reshape(n, h // 2, 2, w // 2, 2, c).max(axis=(2, 4))
+        i += 1
+    logits = x.reshape(len(x), -1) @ weights["dense_kernel"] + weights["dense_bias"]
+    proba = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return proba / proba.sum(axis=1, keepdims=True)
+
+
+def test_numpy_backend_implements_the_architecture(tmp_path):
+    rng = np.random.default_rng(0)
+    channels = [3, 8, 8, 16, 16]  # 28x28 -> 14 -> 7 -> 3 -> 1 after the four blocks
+    weights = {}
+    for i, (c_in, c_out) in enumerate(zip(channels, channels[1:])):
+        weights[f"conv{i}_kernel"] = rng.normal(0, 0.3, (3, 3, c_in, c_out)).astype(np.float32)
+        weights[f"conv{i}_bias"] = rng.normal(0, 0.1, c_out).astype(np.float32)
+    weights["dense_kernel"] = rng.normal(0, 0.3, (channels[-1], 36)).astype(np.float32)
+    weights["dense_bias"] = rng.normal(0, 0.1, 36).astype(np.float32)
+    np.savez(tmp_path / "model.npz", **weights)
+
+    batch = rng.random((4, 28, 28, 3), dtype=np.float32)
+    proba = NumpyBackend(str(tmp_path / "model.npz")).predict(batch)
+    assert proba.shape == (4, 36)
+    np.testing.assert_allclose(proba, reference_predict(weights, batch), rtol=1e-4, atol=1e-6)
+
+
+def test_validation_set_is_prepared_like_plate_characters():
+    images, labels = load_validation_set(VAL_DIR)
+    assert images.shape == (len(labels), 28, 28, 3) and images.dtype == np.float32
+    # find_contours gives the model grayscale characters in the 0-255 range, the same in every channel
+    assert images.max() > 1
+    assert (images == images[..., :1]).all()
+
+
+@pytest.fixture(scope="module")
+def keras_reference():
+    pytest.importorskip("keras")
+    return KerasBackend(MODEL)
+
+
+def test_numpy_export_matches_keras(keras_reference, tmp_path):
+    output_path = str(tmp_path / "model.npz")
+    export_numpy(keras_reference.model, output_path)
+    assert check_parity(keras_reference, load_backend("numpy", output_path), VAL_DIR)
+
+
+def test_onnx_export_matches_keras(keras_reference, tmp_path):
+    pytest.importorskip("tf2onnx")
+    pytest.importorskip("onnxruntime")
+    output_path = str(tmp_path / "model.onnx")
+    export_onnx(keras_reference.model, output_path)
+    assert check_parity(keras_reference, load_backend("onnx", output_path), VAL_DIR)
@@ -0,0 +1,38 @@
+from src.entity.models import History
+from src.services.pagination import NEXT_CURSOR_HEADER
+
+
+def test_list_without_limit_is_complete(client, session):
+    session.add_all([History(paid=False) for _ in range(5)])
+    session.commit()
+
+    response = client.get("/api/history/get_no_paid")
+    assert response.status_code == 200, response.text
+    assert len(response.json()) == 5
+    assert NEXT_CURSOR_HEADER not in response.headers
+
+
+def test_list_pages_with_limit(client):
+    pages, cursors = [], []
+    params = {"limit": 2}
+    while True:
+        response = client.get("/api/history/get_no_paid", params=params)
+        assert response.status_code == 200, response.text
+        pages.append(len(response.json()))
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            break
+        cursors.append(int(cursor))
+        params["after_id"] = cursor
+    assert pages == [2, 2, 1]
+    assert cursors == sorted(cursors)
+
+
+def test_list_limit_is_capped(client):
+    response = client.get("/api/history/get_no_paid", params={"limit": 10 ** 6})
+    assert response.status_code == 422
+
+
+def test_cursor_header_is_exposed_to_browsers(client):
+    response = client.get("/api/history/get_no_paid", params={"limit": 2}, headers={"Origin": "https://example.com"})
+    assert NEXT_CURSOR_HEADER in response.headers["access-control-expose-headers"]
@@ -0,0 +1,95 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from src.database.db import sessionmanager
+from src.entity.models import Blacklist, Car, History, Image, ParkingRate
+from src.repository import gate, occupancy, parking
+from src.repository import history as repositories_history
+from src.repository.car import CarRepository
+from src.services.auth import auth_service
+
+# The plans are taken on the test database for the statements the repository functions send, after ANALYZE
+# of a history like the one of a running parking: most sessions closed and paid, one open session per car.
+# PostgreSQL picks its plans by its own statistics, the check is that every hot query can use its index.
+
+CARS = 20
+SESSIONS_PER_CAR = 50
+START = datetime(2024, 1, 1)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def parking_history(session):
+    session.add_all([ParkingRate(created_at=START + timedelta(days=day)) for day in range(10)])
+    session.add_all([Blacklist(token=f"token-{number}") for number in range(100)])
+    for number in range(CARS):
+        car = Car(plate=f"AA{number:04}BB", credit=100.0)
+        for entry in range(SESSIONS_PER_CAR):
+            entry_time = START + timedelta(days=entry, hours=number)
+            is_open = entry == SESSIONS_PER_CAR - 1
+            session.add(History(car=car, entry_time=entry_time,
+                                exit_time=None if is_open else entry_time + timedelta(hours=1),
+                                paid=not is_open and entry % 10 != 0,
+                                image=Image(current_plate=car.plate, url="", cloudinary_public_id="")))
+    session.commit()
+    session.execute(text("ANALYZE"))
+    session.commit()
+
+
+async def stream_period(db):
+    async for _ in repositories_history.stream_history_by_period(START, START + timedelta(days=7)):
+        pass
+
+
+QUERIES = [
+    ("latest rate and car at the gate", lambda db: gate.get_gate_state(db, "AA0001BB"),
+     "parking_rates", "ix_parking_rates_created_at"),
+    ("open session at the exit", lambda db: gate.record_exit(db, "AA0002BB", "", ""),
+     "history", "ix_history_open_car_id"),
+    ("open session of a car", lambda db: repositories_history.get_open_history(3, db),
+     "history", "ix_history_open_car_id"),
+    ("open sessions", repositories_history.get_history_entries_with_null_exit_time,
+     "history", "ix_history_exit_time"),
+    ("occupancy count", occupancy.count_open_sessions,
+     "history", "ix_history_exit_time"),
+    ("parked cars", lambda db: CarRepository(db).get_cars_currently_parked(),
+     "history", "ix_history_exit_time"),
+    ("unpaid list", repositories_history.get_history_entries_with_null_paid,
+     "history", "ix_history_unpaid_car_id"),
+    ("unpaid session of a car", lambda db: repositories_history.update_paid_history("AA0004BB", True, db),
+     "history", "ix_history_unpaid_car_id"),
+    ("period report", lambda db: repositories_history.get_history_entries_by_period(
+        START, START + timedelta(days=7), db), "history", "ix_history_entry_time"),
+    ("period export", stream_period,
+     "history", "ix_history_entry_time"),
+    ("history of a plate", lambda db: repositories_history.update_car_history("AA0005BB", 6, db),
+     "images", "ix_images_current_plate"),
+    ("rate at entry time", lambda db: repositories_history.get_parking_rates_for_date(START, db),
+     "parking_rates", "ix_parking_rates_created_at"),
+    ("latest rate", parking.get_latest_rate,
+     "parking_rates", "ix_parking_rates_created_at"),
+    ("blacklisted token", lambda db: auth_service.is_token_blacklisted("token-7", db),
+     "blacklist", "ix_blacklist_token"),
+]
+
+
+def query_plans(session, capture_statements, query) -> list[list[str]]:
+    async def with_session():
+        async with sessionmanager.session() as db:
+            await query(db)
+
+    with capture_statements() as statements:
+        asyncio.run(with_session())
+    connection = session.connection()
+    return [[row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+            for statement, parameters in statements
+            if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE"))]
+
+
+@pytest.mark.parametrize("name, query, table, index", QUERIES, ids=[query[0] for query in QUERIES])
+def test_repository_query_uses_index(session, capture_statements, name, query, table, index):
+    plans = query_plans(session, capture_statements, query)
+    assert any(index in step for plan in plans for step in plan), plans
+    assert not any(step == f"SCAN {table}" for plan in plans for step in plan), plans
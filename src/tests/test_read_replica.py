@@ -0,0 +1,74 @@
+import asyncio
+import sqlite3
+
+import pytest
+from sqlalchemy import text
+
+from src.database.db import DatabaseSessionManager, replica_lag
+
+MAX_LAG = 30
+
+
+@pytest.fixture
+def databases(tmp_path):
+    # Each SQLite file tells which database a session reads from
+    urls = {}
+    for name in ("primary", "replica"):
+        path = tmp_path / f"{name}.db"
+        with sqlite3.connect(path) as connection:
+            connection.execute("CREATE TABLE server (name TEXT)")
+            connection.execute("INSERT INTO server VALUES (?)", (name,))
+        urls[name] = f"sqlite+aiosqlite:///{path}"
+    return urls
+
+
+def read_from(manager: DatabaseSessionManager, replication_status: tuple | None = None) -> str:
+    async def replica_lag_of_status():
+        return replica_lag(*replication_status)
+
+    if replication_status is not None:
+        manager._replica_lag = replica_lag_of_status
+
+    async def read():
+        try:
+            async with manager.read_session() as session:
+                return (await session.execute(text("SELECT name FROM server"))).scalar_one()
+        finally:
+            await manager.close()
+
+    return asyncio.run(read())
+
+
+def test_healthy_replica_is_read(databases):
+    manager = DatabaseSessionManager(databases["primary"], databases["replica"], MAX_LAG)
+    assert read_from(manager, (True, True, True, 600.0)) == "replica"
+
+
+def test_stand_in_replica_is_read(databases):
+    manager = DatabaseSessionManager(databases["primary"], databases["replica"], MAX_LAG)
+    assert read_from(manager) == "replica"
+
+
+def test_lagging_replica_falls_back_to_primary(databases):
+    manager = DatabaseSessionManager(databases["primary"], databases["replica"], MAX_LAG)
+    assert read_from(manager, (True, False, True, MAX_LAG + 1.0)) == "primary"
+
+
+def test_replica_that_stopped_streaming_falls_back_to_primary(databases):
+    manager = DatabaseSessionManager(databases["primary"], databases["replica"], MAX_LAG)
+    # It has replayed everything it received, but it receives nothing any more
+    assert read_from(manager, (True, True, False, MAX_LAG + 1.0)) == "primary"
+
+
+def test_unreachable_replica_falls_back_to_primary(databases, tmp_path):
+    manager = DatabaseSessionManager(databases["primary"], f"sqlite+aiosqlite:///{tmp_path}/missing/replica.db",
+                                     MAX_LAG)
+    assert read_from(manager) == "primary"
+
+
+def test_replica_lag():
+    assert replica_lag(False, None, None, None) == 0  # the primary itself
+    assert replica_lag(True, True, True, 600.0) == 0  # idle primary, nothing to replay
+    assert replica_lag(True, False, True, 5.0) == 5.0
+    assert replica_lag(True, True, False, 600.0) == 600.0
+    assert replica_lag(True, None, None, None) == float("inf")  # has not replayed anything yet
@@ -0,0 +1,45 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+
+from src.services import recognition
+from src.services.recognition import RecognitionService
+
+
+def fake_recognize(photo, camera=None, annotate=True):
+    return None, "AA0001BB", [], {}
+
+
+def fail():
+    raise RuntimeError("No model")
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(recognition, "_recognize", fake_recognize)
+    service = RecognitionService("thread", max_workers=2)
+    yield service
+    asyncio.run(service.shutdown())
+
+
+def test_failed_warmup_leaves_the_pool_usable(service, monkeypatch):
+    monkeypatch.setattr(recognition, "_init_worker", fail)
+
+    async def warmup_and_recognize():
+        await service.warmup()
+        return await service.recognize(b"photo")
+
+    assert asyncio.run(warmup_and_recognize())[1] == "AA0001BB"
+    assert service.ready
+
+
+def test_broken_pool_is_recreated(service):
+    # The initializer fails in the worker thread, which breaks the pool like a dead worker process
+    service._executor = ThreadPoolExecutor(max_workers=1, initializer=fail)
+
+    with pytest.raises(HTTPException) as err:
+        asyncio.run(service.recognize(b"photo"))
+    assert err.value.status_code == 503
+    assert asyncio.run(service.recognize(b"photo"))[1] == "AA0001BB"
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, select
+
+from src.entity.models import Car, History, Image, User, user_car_association
+from src.services.auth_cache import auth_cache
+
+# The number of statements of an endpoint must not depend on the number of rows it reads:
+# it is measured with N and with 10 * N cars, each with its parking history
+CARS = 3
+START = datetime(2024, 1, 1, 8)
+
+ENDPOINTS = [
+    "/api/users/me",
+    "/api/users/test_name?userid={user_id}",
+    "/api/users/cars/{user_id}",
+    "/api/admin/cars",
+    "/api/admin/cars/parked",
+    "/api/admin/users-by-car/AA0000BB",
+    "/api/history/get_no_paid",
+    "/api/history/get_null_car_id",
+    "/api/history/get_all_entries_by_period/2024-01-01/2024-12-31",
+    "/api/history/get_entries_by_period/2024-01-01/2024-12-31/{car_id}",
+]
+
+
+@pytest.fixture(scope="module")
+def admin(client, session, user):
+    # The first user to sign up is the admin
+    response = client.post("/api/auth/signup", json=user)
+    assert response.status_code == 201, response.text
+    response = client.post("/api/auth/login", data={"username": user["email"], "password": user["password"]})
+    assert response.status_code == 200, response.text
+    return session.scalar(select(User).where(User.email == user["email"])), response.json()["access_token"]
+
+
+def seed_parking(session, owner: User, cars: int) -> int:
+    session.execute(delete(History))
+    session.execute(delete(Image))
+    session.execute(delete(user_car_association))
+    session.execute(delete(Car))
+    for number in range(cars):
+        car = Car(plate=f"AA{number:04}BB", credit=100.0, users=[owner])
+        entry_time = START + timedelta(days=number)
+        session.add_all([
+            History(car=car, entry_time=entry_time, exit_time=entry_time + timedelta(hours=1), paid=True),
+            History(car=car, entry_time=entry_time + timedelta(hours=2), exit_time=entry_time + timedelta(hours=3)),
+            History(car=car, entry_time=entry_time + timedelta(hours=4)),
+            History(entry_time=entry_time, image=Image(current_plate=f"BB{number:04}AA", url="",
+                                                       cloudinary_public_id="")),
+        ])
+    session.commit()
+    return session.scalar(select(Car.id).where(Car.plate == "AA0000BB"))
+
+
+def count_statements(client, capture_statements, url: str, token: str) -> int:
+    auth_cache.clear()  # the authentication queries are counted too
+    with capture_statements() as statements:
+        response = client.get(url, headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200, response.text
+    return len(statements)
+
+
+@pytest.mark.parametrize("endpoint", ENDPOINTS)
+def test_statements_do_not_grow_with_rows(client, session, capture_statements, admin, endpoint):
+    owner, token = admin
+    counts = []
+    for cars in (CARS, 10 * CARS):
+        car_id = seed_parking(session, owner, cars)
+        url = endpoint.format(user_id=owner.id, car_id=car_id)
+        counts.append(count_statements(client, capture_statements, url, token))
+    assert counts[0] == counts[1], counts
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from src.entity.models import Image, UploadStatus
+from src.services import upload_queue as upload_queue_module
+from src.services.storage import LocalStorage
+from src.services.upload_queue import INFLIGHT, SEPARATOR, UploadQueue
+
+DEAD_PID = 2 ** 22 + 1  # above the default pid_max of Linux
+
+
+class RecordingStorage:
+    def __init__(self):
+        self.uploads = []
+
+    async def upload_image(self, image_file: bytes, folder_path: str = None):
+        self.uploads.append(image_file)
+        await asyncio.sleep(0.01)
+        return f"/static/{len(self.uploads)}.png", str(len(self.uploads))
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    storage = RecordingStorage()
+    monkeypatch.setattr(upload_queue_module, "storage", storage)
+    return storage
+
+
+@pytest.fixture
+def image_id(session):
+    image = Image(current_plate="AA0001BB", url="", cloudinary_public_id="", upload_status=UploadStatus.pending)
+    session.add(image)
+    session.commit()
+    return image.id
+
+
+async def drain(*queues: UploadQueue):
+    for queue in queues:
+        await queue.start()
+    for queue in queues:
+        await queue._queue.join()
+    for queue in queues:
+        await queue.stop()
+
+
+def test_processes_sharing_the_spool_upload_once(tmp_path, storage, image_id):
+    (tmp_path / f"{image_id}{SEPARATOR}Entry_photos").write_bytes(b"image")
+    # Two API processes started on the same spool both find the image
+    asyncio.run(drain(UploadQueue(str(tmp_path)), UploadQueue(str(tmp_path))))
+
+    assert storage.uploads == [b"image"]
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_claim_of_a_stopped_process_is_uploaded(tmp_path, storage, image_id):
+    (tmp_path / f"{image_id}{SEPARATOR}Entry_photos{INFLIGHT}{DEAD_PID}").write_bytes(b"image")
+    asyncio.run(drain(UploadQueue(str(tmp_path))))
+
+    assert storage.uploads == [b"image"]
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_failed_upload_is_released_to_the_spool(tmp_path, storage, image_id, monkeypatch):
+    async def fail(image_file, folder_path=None):
+        raise OSError("storage is down")
+
+    monkeypatch.setattr(storage, "upload_image", fail)
+    path = tmp_path / f"{image_id}{SEPARATOR}Entry_photos"
+    path.write_bytes(b"image")
+    asyncio.run(drain(UploadQueue(str(tmp_path), max_retries=0)))
+
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_stored_image_is_named_by_its_content(tmp_path):
+    local_storage = LocalStorage(root=tmp_path)
+
+    async def upload(image_file):
+        return (await local_storage.upload_image(image_file, "Entry_photos"))[1]
+
+    # Two events of the same frame differ by the time drawn on the image
+    first, second = asyncio.run(upload(b"\x89PNG entry 08:00")), asyncio.run(upload(b"\x89PNG exit 09:00"))
+    assert first != second
+    assert (tmp_path / first).read_bytes() == b"\x89PNG entry 08:00"
+    assert asyncio.run(upload(b"\x89PNG entry 08:00")) == first